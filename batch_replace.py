@@ -0,0 +1,96 @@
+import difflib
+import os
+import re
+import tempfile
+
+from library_search import list_markdown_files, may_match, required_literal
+from search_utils import compile_pattern
+
+# Сколько строк diff показывать в отчёте по одному файлу
+DIFF_SAMPLE_LINES = 20
+
+
+def replace_text(text, term, replacement, use_regex=False, match_case=False):
+    """Замена как в ReplaceDialog: (новый текст, число замен). Бросает re.error"""
+    pattern = compile_pattern(term, use_regex, match_case)
+    if use_regex:
+        return pattern.subn(replacement, text)
+    # Обычная замена вставляет строку как есть, без разбора \1 и т. п.
+    return pattern.subn(lambda match: replacement, text)
+
+
+def diff_sample(old, new, path):
+    lines = difflib.unified_diff(
+        old.splitlines(), new.splitlines(), path, path, n=0, lineterm=""
+    )
+    sample = []
+    for line in lines:
+        if len(sample) >= DIFF_SAMPLE_LINES:
+            sample.append("…")
+            break
+        sample.append(line)
+    return "\n".join(sample)
+
+
+def write_atomic(path, text):
+    """Запись через временный файл в той же папке и os.replace"""
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def error_result(path, error):
+    """Результат process_file для файла, который обработать не удалось"""
+    return path, 0, None, "", error
+
+
+def process_file(path, term, replacement, use_regex, match_case, apply=False, mtime=None):
+    """Проверка или замена в одном файле.
+
+    Возвращает (путь, число замен, mtime, пример diff, ошибка). При apply
+    файл записывается, только если его время изменения всё ещё равно mtime
+    из пробного прогона.
+    """
+    try:
+        if not may_match(path, required_literal(term, use_regex), match_case):
+            return path, 0, None, "", None
+        stat = os.stat(path)
+        if apply and stat.st_mtime != mtime:
+            return path, 0, stat.st_mtime, "", "файл изменён после проверки"
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            old = f.read()
+        new, count = replace_text(old, term, replacement, use_regex, match_case)
+        if not count or new == old:
+            return path, 0, stat.st_mtime, "", None
+        if apply:
+            write_atomic(path, new)
+            return path, count, None, "", None
+        return path, count, stat.st_mtime, diff_sample(old, new, path), None
+    except (OSError, UnicodeDecodeError, re.error) as e:
+        return error_result(path, str(e))
+
+
+def dry_run_tasks(folder, term, replacement, use_regex, match_case):
+    return [
+        (path, term, replacement, use_regex, match_case)
+        for path in list_markdown_files(folder)
+    ]
+
+
+def apply_tasks(report, term, replacement, use_regex, match_case):
+    """Задания замены по отчёту пробного прогона: [(путь, число, mtime, ...)]"""
+    return [
+        (path, term, replacement, use_regex, match_case, True, mtime)
+        for path, count, mtime, _, error in report
+        if count and not error
+    ]
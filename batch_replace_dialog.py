@@ -0,0 +1,215 @@
+import os
+import re
+import tkinter as tk
+from tkinter import filedialog
+
+from batch_replace import apply_tasks, dry_run_tasks, error_result, process_file
+from dialog_manager import DialogManager
+from library_search import PoolJob
+from search_utils import compile_pattern
+
+
+class BatchReplaceDialog:
+    """Замена во всех Markdown-файлах папки: сначала пробный прогон с отчётом,
+    затем запись изменённых файлов"""
+
+    def __init__(self, root, on_applied, folder="", skip_path=None):
+        # on_applied(пути) — вызывается со списком перезаписанных файлов
+        self.on_applied = on_applied
+        # skip_path(путь) -> True, если файл записывать нельзя (например,
+        # он открыт в редакторе с несохранёнными правками)
+        self.skip_path = skip_path
+        self.job = None
+        # Отчёт пробного прогона и параметры, с которыми он получен
+        self.report = []
+        self.report_params = None
+        self.applied = []
+        self.errors = []
+
+        self.win = tk.Toplevel(root)
+        self.win.title("Замена в папке")
+        self.win.transient(root)
+
+        tk.Label(self.win, text="Папка:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.folder_var = tk.StringVar(value=folder)
+        tk.Entry(self.win, textvariable=self.folder_var, width=60).grid(
+            row=0, column=1, columnspan=3, padx=5, pady=5, sticky="we"
+        )
+        tk.Button(
+            self.win, text="📂", command=self.choose_folder, font=("Noto Color Emoji", 10)
+        ).grid(row=0, column=4, padx=2)
+
+        tk.Label(self.win, text="Найти:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.search_entry = tk.Entry(self.win, width=40)
+        self.search_entry.grid(row=1, column=1, columnspan=3, padx=5, pady=5, sticky="we")
+        self.search_entry.focus_set()
+
+        tk.Label(self.win, text="Заменить:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        self.replace_entry = tk.Entry(self.win, width=40)
+        self.replace_entry.grid(row=2, column=1, columnspan=3, padx=5, pady=5, sticky="we")
+
+        self.regex_var = tk.BooleanVar()
+        tk.Checkbutton(self.win, text="Регулярное выражение", variable=self.regex_var).grid(
+            row=3, column=1, padx=5, sticky="w"
+        )
+        self.case_sensitive_var = tk.BooleanVar()
+        tk.Checkbutton(
+            self.win, text="С учетом регистра", variable=self.case_sensitive_var
+        ).grid(row=3, column=2, padx=5, sticky="w")
+
+        tk.Button(self.win, text="Проверить", command=self.dry_run).grid(row=4, column=1)
+        self.apply_button = tk.Button(
+            self.win, text="Заменить", command=self.apply, state=tk.DISABLED
+        )
+        self.apply_button.grid(row=4, column=2)
+        tk.Button(
+            self.win, text="⏹", command=self.cancel, font=("Noto Color Emoji", 10)
+        ).grid(row=4, column=3)
+
+        report_frame = tk.Frame(self.win)
+        report_frame.grid(row=5, column=0, columnspan=5, sticky="nsew", padx=5, pady=5)
+        self.report_text = tk.Text(report_frame, width=100, height=25, wrap="none")
+        scroll = tk.Scrollbar(report_frame, orient=tk.VERTICAL, command=self.report_text.yview)
+        self.report_text.configure(yscrollcommand=scroll.set, state=tk.DISABLED)
+        self.report_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll.pack(side=tk.LEFT, fill=tk.Y)
+        self.win.grid_rowconfigure(5, weight=1)
+        self.win.grid_columnconfigure(1, weight=1)
+
+        self.status_label = tk.Label(self.win, anchor="w")
+        self.status_label.grid(row=6, column=0, columnspan=5, sticky="we", padx=5)
+
+        self.win.bind("<Escape>", lambda e: self.close())
+        self.win.protocol("WM_DELETE_WINDOW", self.close)
+
+    def choose_folder(self):
+        folder = filedialog.askdirectory(
+            title="Выбери папку с md файлами", initialdir=self.folder_var.get() or None
+        )
+        if folder:
+            self.folder_var.set(folder)
+
+    def params(self):
+        return (
+            self.folder_var.get(),
+            self.search_entry.get(),
+            self.replace_entry.get(),
+            self.regex_var.get(),
+            self.case_sensitive_var.get(),
+        )
+
+    def dry_run(self):
+        self.cancel()
+        params = self.params()
+        folder, term, replacement, use_regex, match_case = params
+        if not term:
+            return
+        if not os.path.isdir(folder):
+            DialogManager.show_dialog("Ошибка", "Папка не найдена")
+            return
+        try:
+            compile_pattern(term, use_regex, match_case)
+        except re.error as e:
+            DialogManager.show_dialog("Ошибка RegEx", str(e))
+            return
+
+        self.report = []
+        self.report_params = None
+        self.errors = []
+        self.apply_button.config(state=tk.DISABLED)
+        self._clear_report()
+        tasks = dry_run_tasks(folder, term, replacement, use_regex, match_case)
+        self.status_label.config(text=f"Проверка {len(tasks)} файлов…")
+        self.job = PoolJob(
+            self.win,
+            process_file,
+            tasks,
+            self._add_report,
+            lambda: self._dry_run_done(params),
+            error_result,
+        )
+
+    def _add_report(self, result):
+        path, count, mtime, diff, error = result
+        if error:
+            self.errors.append((path, error))
+            self._write_report(f"{path}: ошибка: {error}\n\n")
+        elif count:
+            self.report.append(result)
+            self._write_report(f"{path}: {count}\n{diff}\n\n")
+
+    def _dry_run_done(self, params):
+        self.job = None
+        total = sum(count for _, count, _, _, _ in self.report)
+        status = f"Замен: {total} в {len(self.report)} файлах"
+        if self.errors:
+            status += f", ошибок: {len(self.errors)}"
+        self.status_label.config(text=status)
+        if self.report:
+            self.report_params = params
+            self.apply_button.config(state=tk.NORMAL)
+
+    def apply(self):
+        # Применяется ровно то, что показано в отчёте
+        if self.params() != self.report_params:
+            DialogManager.show_dialog("Ошибка", "Параметры изменены — повторите проверку")
+            return
+        _, term, replacement, use_regex, match_case = self.report_params
+        self.apply_button.config(state=tk.DISABLED)
+        self.applied = []
+        self.errors = []
+        self._clear_report()
+        report = []
+        for result in self.report:
+            path = result[0]
+            if self.skip_path and self.skip_path(path):
+                reason = "открыт в редакторе с несохранёнными правками"
+                self.errors.append((path, reason))
+                self._write_report(f"{path}: не изменён: {reason}\n")
+            else:
+                report.append(result)
+        tasks = apply_tasks(report, term, replacement, use_regex, match_case)
+        self.status_label.config(text=f"Замена в {len(tasks)} файлах…")
+        self.job = PoolJob(
+            self.win, process_file, tasks, self._add_applied, self._apply_done, error_result
+        )
+
+    def _add_applied(self, result):
+        path, count, _, _, error = result
+        if error:
+            self.errors.append((path, error))
+            self._write_report(f"{path}: не изменён: {error}\n")
+        elif count:
+            self.applied.append(path)
+            self._write_report(f"{path}: {count}\n")
+
+    def _apply_done(self):
+        self.job = None
+        self.report = []
+        self.report_params = None
+        status = f"Изменено файлов: {len(self.applied)}"
+        if self.errors:
+            status += f", пропущено: {len(self.errors)}"
+        self.status_label.config(text=status)
+        if self.applied:
+            self.on_applied(self.applied)
+
+    def _clear_report(self):
+        self.report_text.configure(state=tk.NORMAL)
+        self.report_text.delete("1.0", tk.END)
+        self.report_text.configure(state=tk.DISABLED)
+
+    def _write_report(self, text):
+        self.report_text.configure(state=tk.NORMAL)
+        self.report_text.insert(tk.END, text)
+        self.report_text.configure(state=tk.DISABLED)
+
+    def cancel(self):
+        if self.job and self.job.running:
+            self.job.cancel()
+            self.status_label.config(text="Остановлено")
+        self.job = None
+
+    def close(self):
+        self.cancel()
+        self.win.destroy()
@@ -0,0 +1,80 @@
+"""Автозамена TextCorrector: наивные str.replace / re.sub и построчная
+обработка начала строк против подготовленных правил (RuleSet.apply) и
+TextCorrector.fix_line_start_spaces. Заодно сверяет результаты.
+
+Запуск из корня проекта:
+    python benchmarks/corrector_benchmark.py [файл.md ...]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from correction_rules import RuleSet, read_table  # noqa: E402
+from text_corrector import APP_RULES_PATH, TextCorrector  # noqa: E402
+
+SAMPLE = (
+    "# Глава {n}\n"
+    "\n"
+    "«Обычный» абзац номер {n} - с тире , лишними  пробелами и многоточием. .\n"
+    "Вторая строка того же абзаца ... и ещё одна — “в кавычках” !\n"
+    "\n"
+    "* пункт списка\n"
+    "  ****\n"
+)
+
+
+def make_document(lines):
+    return "".join(
+        SAMPLE.format(n=n) for n in range(lines // SAMPLE.count("\n") + 1)
+    )
+
+
+def legacy_line_starts(content):
+    """Старая схема: splitlines и сборка строк заново"""
+    new_lines = []
+    for line in content.splitlines():
+        stripped = line.lstrip()
+        if line.startswith(("#", "%")) or stripped.startswith("*"):
+            new_lines.append(line)
+        else:
+            new_lines.append(" " + stripped if stripped else stripped)
+    return "\n".join(new_lines)
+
+
+def measure(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    rules = RuleSet.from_table(read_table(APP_RULES_PATH))
+    corrector = TextCorrector(None)
+
+    documents = []
+    for path in sys.argv[1:]:
+        with open(path, "r", encoding="utf-8") as f:
+            documents.append((os.path.basename(path), f.read()))
+    if not documents:
+        documents = [(f"{lines} строк", make_document(lines)) for lines in (10_000, 50_000, 200_000)]
+
+    print(f"{'текст':>20} {'правила':>17} {'начала строк':>17}")
+    print(f"{'':>20} {'было':>8} {'стало':>8} {'было':>8} {'стало':>8}")
+    for name, document in documents:
+        legacy_rules, expected = measure(rules.apply_reference, document)
+        current_rules, result = measure(rules.apply, document)
+        legacy_lines, expected_lines = measure(legacy_line_starts, expected)
+        current_lines, result_lines = measure(corrector.fix_line_start_spaces, result)
+        same = result == expected and result_lines == expected_lines
+        print(
+            f"{name:>20} {legacy_rules:>7.3f}с {current_rules:>7.3f}с "
+            f"{legacy_lines:>7.3f}с {current_lines:>7.3f}с"
+            + ("" if same else "  РАСХОЖДЕНИЕ")
+        )
+
+
+if __name__ == "__main__":
+    main()
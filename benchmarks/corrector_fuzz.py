@@ -0,0 +1,151 @@
+"""Дифференциальная проверка автозамены на случайных текстах с фиксированным
+зерном: подготовленные правила (RuleSet.apply) против наивных str.replace /
+re.sub (apply_reference), быстрый fix_line_start_spaces против построчной
+обработки и потоковый iter_corrected против normalize_text. Расхождения
+печатаются, код возврата 1.
+
+Запуск из корня проекта:
+    python benchmarks/corrector_fuzz.py [зерно] [число текстов]
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corrector_benchmark import legacy_line_starts  # noqa: E402
+from correction_rules import LITERAL, REGEX, Rule, RuleSet, read_table  # noqa: E402
+from text_corrector import APP_RULES_PATH, TextCorrector  # noqa: E402
+
+# Сколько расхождений каждого вида печатать
+SHOW_MISMATCHES = 5
+
+# Куски случайных текстов помимо шаблонов и замен таблицы правил:
+# служебные строки, списки и все виды пробелов и переводов строк
+EXTRA_FRAGMENTS = (
+    ".", "*", "…", " ", "\n", "\n\n", "#", "%", "-", "—", '"', "x", "Слово",
+    "\t", "\r", "\r\n", "\x1c", " ", "\x85", "\xa0", "\x1f", "_", "!",
+    "?", ",", "\f", "\v", "  ", "\n ", "\n* ", "\n\t*",
+)
+
+# Шаблоны для случайных наборов правил: повторы, якоря, lookaround,
+# альтернативы, обратные ссылки и флаги
+RANDOM_REGEXES = (
+    r"a{2,}", r"b+", r"\.{2,}", r"^\*", r"x(?!a)", r"(?<=b)#", r"[ab]#",
+    r"#$", r"\n(?!\n)", r"a|b", r"(?:ab)+", r"b*", r"a{2,3}?b", r"a{1,2}b{2}",
+    r"a{3}", r"(a)\1", r"a{2,}?", r"(?i)A{2}", r"\*{2,}(?=a)",
+)
+RANDOM_ALPHABET = "ab.\n *#"
+
+FILE_NAMES = ("Книга [Автор].ru.md", "a.b.md", "x.md")
+
+
+def table_fragments(table):
+    fragments = list(EXTRA_FRAGMENTS)
+    for section in table.values():
+        for old, new in section.items():
+            fragments += [old, new]
+    return [fragment for fragment in fragments if fragment]
+
+
+def split_randomly(rnd, text):
+    """Текст кусками случайной длины, как его отдаёт поток"""
+    pieces = []
+    while text:
+        size = rnd.randint(1, 8)
+        pieces.append(text[:size])
+        text = text[size:]
+    return pieces
+
+
+class Checker:
+    def __init__(self):
+        self.checked = 0
+        self.mismatches = {}
+
+    def compare(self, kind, source, result, expected):
+        self.checked += 1
+        if result == expected:
+            return
+        count = self.mismatches.get(kind, 0) + 1
+        self.mismatches[kind] = count
+        if count <= SHOW_MISMATCHES:
+            print(f"{kind}: {source!r}\n  получено: {result!r}\n  ожидалось: {expected!r}")
+
+
+def check_table(checker, rnd, rounds):
+    """Правила из replacements.json на текстах из их же шаблонов и замен"""
+    table = read_table(APP_RULES_PATH)
+    rules = RuleSet.from_table(table)
+    corrector = TextCorrector(None)
+    fragments = table_fragments(table)
+    for _ in range(rounds):
+        text = "".join(rnd.choice(fragments) for _ in range(rnd.randint(0, 25)))
+        if rnd.random() < 0.2:
+            text = "#" + text
+        name = rnd.choice(FILE_NAMES)
+
+        checker.compare("правила", text, rules.apply(text), rules.apply_reference(text))
+        checker.compare(
+            "начала строк",
+            text,
+            corrector.fix_line_start_spaces(text),
+            legacy_line_starts(text),
+        )
+        checker.compare(
+            "поток",
+            text,
+            "".join(corrector.iter_corrected(split_randomly(rnd, text), name)),
+            corrector.normalize_text(text.strip(), name),
+        )
+
+
+def check_random_rules(checker, rnd, rounds):
+    """Случайные наборы правил на коротких текстах из малого алфавита"""
+
+    def random_string(length):
+        return "".join(rnd.choice(RANDOM_ALPHABET) for _ in range(length))
+
+    for _ in range(rounds):
+        rules = []
+        for _ in range(rnd.randint(1, 5)):
+            if rnd.random() < 0.4:
+                old = random_string(rnd.randint(1, 3))
+                rules.append(Rule(LITERAL, old, random_string(rnd.randint(0, 3))))
+            else:
+                old = rnd.choice(RANDOM_REGEXES)
+                rules.append(Rule(REGEX, old, random_string(rnd.randint(0, 2))))
+        rule_set = RuleSet(rules)
+        for _ in range(10):
+            text = random_string(rnd.randint(0, 30))
+            source = ([(rule.old, rule.new) for rule in rules], text)
+            checker.compare(
+                "случайные правила", source, rule_set.apply(text), rule_set.apply_reference(text)
+            )
+            checker.compare(
+                "случайные правила, поток",
+                source,
+                "".join(rule_set.stream(split_randomly(rnd, text))),
+                rule_set.apply(text),
+            )
+
+
+def main():
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    rnd = random.Random(seed)
+
+    checker = Checker()
+    check_table(checker, rnd, rounds)
+    check_random_rules(checker, rnd, rounds // 10)
+
+    print(f"зерно {seed}: проверено {checker.checked}")
+    for kind, count in checker.mismatches.items():
+        print(f"  РАСХОЖДЕНИЙ ({kind}): {count}")
+    sys.exit(1 if checker.mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Сравнение подсветки через Tk search и через markdown_tokenizer.
+
+Запуск из корня проекта:
+    python benchmarks/highlight_benchmark.py [число строк]
+"""
+
+import os
+import sys
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from markdown_tokenizer import tokenize  # noqa: E402
+
+SAMPLE = (
+    "# Глава {n}\n"
+    "\n"
+    " Обычный абзац с **жирным**, *курсивом* и ***обоими*** сразу.\n"
+    " Ссылка [сюда](http://example.com) и `код`, а ещё #тег рядом.\n"
+    "* элемент списка\n"
+)
+
+
+def make_document(lines):
+    blocks = []
+    for n in range(lines // SAMPLE.count("\n") + 1):
+        blocks.append(SAMPLE.format(n=n))
+    return "".join(blocks)
+
+
+def legacy_highlight(text_widget):
+    """Старая схема: один Tcl search на каждое совпадение каждого паттерна"""
+    patterns = (
+        (r"\*\*\*(.+?)\*\*\*", "bold_italic"),
+        (r"#([a-zA-Zа-яА-ЯёЁ_-]+?\s)", "tag"),
+        (r"\*\*(.+?)\*\*", "bold"),
+        (r"\*(.+?)\*", "italic"),
+        (r"`(.+?)`", "code"),
+        (r"\[(.+?)\]\((.+?)\)", "link"),
+    )
+    count = tk.IntVar()
+    for pattern, tag in patterns:
+        index = "1.0"
+        while True:
+            index = text_widget.search(
+                pattern, index, stopindex="end", count=count, regexp=True
+            )
+            if not index or count.get() == 0:
+                break
+            end = f"{index}+{count.get()}c"
+            text_widget.tag_add(tag, index, end)
+            index = end
+
+
+def tokenizer_highlight(text_widget):
+    text = text_widget.get("1.0", "end-1c")
+    for tag, start, end in tokenize(text):
+        text_widget.tag_add(tag, start, end)
+
+
+def measure(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    document = make_document(lines)
+    print(f"Документ: {document.count(chr(10))} строк, {len(document)} символов")
+
+    print(f"tokenize (без Tk): {measure(tokenize, document):.2f} с")
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Tk недоступен ({e}), сравнение с Tk search пропущено")
+        return
+    root.withdraw()
+    text_widget = tk.Text(root)
+    text_widget.insert("1.0", document)
+
+    legacy = measure(legacy_highlight, text_widget)
+    for tag in text_widget.tag_names():
+        text_widget.tag_remove(tag, "1.0", "end")
+    current = measure(tokenizer_highlight, text_widget)
+
+    print(f"Tk search:  {legacy:.2f} с")
+    print(f"tokenizer:  {current:.2f} с")
+    print(f"ускорение:  x{legacy / current:.1f}")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Перевод смещений совпадений в индексы Text: подсчёт переводов строк на
+каждое совпадение против таблицы начал строк (search_utils.LineOffsets).
+
+Запуск из корня проекта:
+    python benchmarks/search_benchmark.py [шаблон]
+"""
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_utils import iter_match_indices  # noqa: E402
+
+SAMPLE = (
+    "# Глава {n}\n"
+    "\n"
+    " Обычный абзац номер {n}, в котором 12 слов и 3 цифры.\n"
+    "\n"
+    "\n"
+    "\n"
+    " Ещё одна строка текста.\n"
+)
+
+
+def make_document(lines):
+    blocks = []
+    for n in range(lines // SAMPLE.count("\n") + 1):
+        blocks.append(SAMPLE.format(n=n))
+    return "".join(blocks)
+
+
+def legacy_indices(text, pattern):
+    """Старая схема: count и rfind от начала текста на каждое совпадение"""
+    result = []
+    for match in pattern.finditer(text):
+        for index in (match.start(), match.end()):
+            line = text.count("\n", 0, index) + 1
+            col = index - text.rfind("\n", 0, index) - 1
+            result.append(f"{line}.{col}")
+    return result
+
+
+def measure(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def main():
+    pattern = re.compile(sys.argv[1] if len(sys.argv) > 1 else r"\n\n\n")
+    print(f"Шаблон: {pattern.pattern!r}")
+    print(f"{'строк':>8} {'совпадений':>11} {'count/rfind':>12} {'LineOffsets':>12}")
+    for lines in (5_000, 10_000, 20_000, 40_000):
+        document = make_document(lines)
+        matches = sum(1 for _ in pattern.finditer(document))
+        legacy = measure(legacy_indices, document, pattern)
+        current = measure(list, iter_match_indices(document, pattern))
+        print(f"{lines:>8} {matches:>11} {legacy:>11.3f}с {current:>11.3f}с")
+
+
+if __name__ == "__main__":
+    main()
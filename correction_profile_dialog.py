@@ -0,0 +1,114 @@
+import json
+import tkinter as tk
+from tkinter import filedialog, ttk
+
+from dialog_manager import DialogManager
+
+# Колонки таблицы: (ключ, заголовок, ширина)
+COLUMNS = (
+    ("rule", "Правило", 260),
+    ("kind", "Тип", 70),
+    ("ms", "Время, мс", 90),
+    ("matches", "Совпадений", 90),
+    ("removed", "Удалено байт", 100),
+    ("added", "Вставлено байт", 110),
+)
+
+
+class CorrectionProfileDialog:
+    """Замеры правил автозамены: время, совпадения и изменённые байты;
+    сортировка по клику на заголовок, экспорт в JSON"""
+
+    def __init__(self, root, stats, file_path=""):
+        self.stats = stats
+        self.file_path = file_path
+
+        self.win = tk.Toplevel(root)
+        self.win.title("Профиль автозамены")
+        self.win.transient(root)
+
+        frame = tk.Frame(self.win)
+        frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.tree = ttk.Treeview(
+            frame, columns=[key for key, _, _ in COLUMNS], show="headings", height=20
+        )
+        for key, title, width in COLUMNS:
+            self.tree.heading(key, text=title, command=lambda key=key: self.sort_by(key))
+            self.tree.column(key, width=width, anchor="w" if key == "rule" else "e")
+        scroll = tk.Scrollbar(frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll.pack(side=tk.LEFT, fill=tk.Y)
+
+        bottom = tk.Frame(self.win)
+        bottom.pack(side=tk.TOP, fill=tk.X, padx=5, pady=5)
+        total = sum(stat.seconds for stat in stats)
+        changed = sum(stat.removed + stat.added for stat in stats)
+        tk.Label(
+            bottom,
+            anchor="w",
+            text=f"Правил: {len(stats)}, всего {total * 1000:.1f} мс, "
+            f"изменено байт: {changed}",
+        ).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        tk.Button(bottom, text="Экспорт JSON", command=self.export).pack(side=tk.LEFT)
+
+        # Самые медленные правила сверху
+        self.sort_key = None
+        self.sort_descending = True
+        self.sort_by("ms")
+
+        self.win.bind("<Escape>", lambda e: self.win.destroy())
+
+    @staticmethod
+    def _value(stat, key):
+        return {
+            "rule": stat.old,
+            "kind": stat.kind,
+            "ms": stat.seconds,
+            "matches": stat.matches,
+            "removed": stat.removed,
+            "added": stat.added,
+        }[key]
+
+    def sort_by(self, key):
+        # Повторный клик меняет направление; числа — по убыванию
+        descending = key != "rule" and key != "kind"
+        if self.sort_key == key:
+            descending = not self.sort_descending
+        self.sort_key = key
+        self.sort_descending = descending
+
+        self.tree.delete(*self.tree.get_children())
+        for stat in sorted(self.stats, key=lambda s: self._value(s, key), reverse=descending):
+            self.tree.insert(
+                "",
+                tk.END,
+                values=(
+                    repr(stat.old)[1:-1],
+                    stat.kind,
+                    f"{stat.seconds * 1000:.2f}",
+                    stat.matches,
+                    stat.removed,
+                    stat.added,
+                ),
+            )
+
+    def export(self):
+        path = filedialog.asksaveasfilename(
+            parent=self.win,
+            title="Сохранить профиль",
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json")],
+        )
+        if not path:
+            return
+        data = {
+            "file": self.file_path,
+            "total_seconds": sum(stat.seconds for stat in self.stats),
+            "rules": [stat.to_dict() for stat in self.stats],
+        }
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            DialogManager.show_dialog("Ошибка", str(e), timeout=3000)
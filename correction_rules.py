@@ -0,0 +1,358 @@
+"""Скомпилированный набор правил автозамены для TextCorrector.
+
+Правила применяются строго по порядку, как последовательные str.replace
+и re.sub, но регулярки готовятся заранее:
+
+* шаблон компилируется один раз;
+* ведущий повтор символа (\\.{2,}) разворачивается в литерал (\\.\\.\\.*),
+  чтобы re искал совпадения быстрым поиском подстроки, а не пробовал
+  шаблон в каждой позиции;
+* из шаблона выводится подстрока, без которой совпадение невозможно;
+  если её нет в тексте, проход пропускается без копирования строки.
+
+Результат совпадает с наивным применением (RuleSet.apply_reference).
+
+Файл правил — JSON-объект с разделами в порядке применения:
+
+    {
+      "simple": {"строка": "замена", ...},
+      "regex": {"шаблон": "замена", ...},
+      "cleanup": {"строка": "замена", ...}
+    }
+
+В файле-дополнении (merge_tables) значение null удаляет правило.
+
+Для потоковой обработки (RuleSet.stream) каждое правило режет поток
+там, где его совпадения не могут пересечь границу и где проверки
+шаблона по обе стороны от неё дают тот же результат, что и в целом
+тексте; поэтому результат совпадает с apply на всём тексте.
+"""
+
+import json
+import re
+import time
+
+try:
+    from re import _compiler as sre_compile
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_compile
+    import sre_constants
+    import sre_parse
+
+LITERAL = "literal"
+REGEX = "regex"
+
+REGEX_FLAGS = re.MULTILINE
+
+# Разделы таблицы правил в порядке применения
+SECTIONS = ("simple", "regex", "cleanup")
+
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+
+# Символы, которые совпадают с \s в str-шаблоне
+WHITESPACE = (
+    "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003"
+    "\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000"
+)
+
+
+class RulesError(ValueError):
+    """Ошибка в файле правил; сообщение указывает файл, раздел и правило"""
+
+
+def _single_char(items):
+    """Код символа, если тело повтора — один литерал"""
+    if len(items) == 1 and items[0][0] is sre_constants.LITERAL:
+        return items[0][1]
+    return None
+
+
+def required_literal(parsed):
+    """Самая длинная подстрока, входящая в любое совпадение шаблона"""
+    runs = [""]
+    for op, arg in parsed:
+        if op is sre_constants.LITERAL:
+            runs[-1] += chr(arg)
+            continue
+        if op in _REPEATS and _single_char(arg[2]) is not None and arg[0] > 0:
+            runs[-1] += chr(_single_char(arg[2])) * arg[0]
+            if arg[0] == arg[1]:
+                continue
+        runs.append("")
+    return max(runs, key=len)
+
+
+def unroll_leading_repeat(parsed):
+    """X{m,n} в начале шаблона -> m литералов X и X{0,n-m}: у шаблона
+    появляется литеральный префикс, по которому re ищет совпадения"""
+    if not len(parsed.data):
+        return False
+    op, arg = parsed.data[0]
+    char = _single_char(arg[2]) if op in _REPEATS else None
+    if char is None or arg[0] == 0:
+        return False
+    low, high, body = arg
+    rest = (op, (0, high if high is sre_constants.MAXREPEAT else high - low, body))
+    parsed.data[:1] = [(sre_constants.LITERAL, char)] * low + [rest]
+    return True
+
+
+def examined_chars(parsed):
+    """Что проверяет шаблон: (символы, есть ли ^, есть ли $).
+
+    Символы — все, которые шаблон может поглотить или проверить в
+    lookaround. На любом другом символе шаблон ведёт себя так же, как на
+    конце текста. None — шаблон может зависеть от любого символа.
+    """
+    chars = set()
+    begin = end = False
+    for op, arg in parsed:
+        subpatterns = ()
+        if op is sre_constants.LITERAL:
+            chars.add(chr(arg))
+        elif op is sre_constants.IN:
+            for item_op, item_arg in arg:
+                if item_op is sre_constants.LITERAL:
+                    chars.add(chr(item_arg))
+                elif item_op is sre_constants.RANGE and item_arg[1] - item_arg[0] < 256:
+                    chars.update(map(chr, range(item_arg[0], item_arg[1] + 1)))
+                elif item_op is sre_constants.CATEGORY and (
+                    item_arg is sre_constants.CATEGORY_SPACE
+                ):
+                    chars.update(WHITESPACE)
+                else:
+                    return None
+        elif op in _REPEATS:
+            subpatterns = (arg[2],)
+        elif op is sre_constants.SUBPATTERN and not arg[1] and not arg[2]:
+            subpatterns = (arg[3],)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            subpatterns = (arg[1],)
+        elif op is sre_constants.BRANCH:
+            subpatterns = arg[1]
+        elif op is sre_constants.AT and arg is sre_constants.AT_BEGINNING:
+            begin = True
+        elif op is sre_constants.AT and arg is sre_constants.AT_END:
+            end = True
+        else:
+            return None
+
+        for sub in subpatterns:
+            examined = examined_chars(sub)
+            if examined is None:
+                return None
+            chars |= examined[0]
+            begin |= examined[1]
+            end |= examined[2]
+    return chars, begin, end
+
+
+class RuleStat:
+    """Замер правила в профилирующем режиме: время прохода, число
+    совпадений и байты UTF-8, удалённые и вставленные заменами"""
+
+    def __init__(self, kind, old, new):
+        self.kind = kind
+        self.old = old
+        self.new = new
+        self.seconds = 0.0
+        self.matches = 0
+        self.removed = 0
+        self.added = 0
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "old": self.old,
+            "new": self.new,
+            "seconds": self.seconds,
+            "matches": self.matches,
+            "removed_bytes": self.removed,
+            "added_bytes": self.added,
+        }
+
+
+class Rule:
+    """Одно правило: замена строки (LITERAL) или регулярного выражения (REGEX)"""
+
+    def __init__(self, kind, old, new):
+        self.kind = kind
+        self.old = old
+        self.new = new
+        self.pattern = None
+        self.literal = old
+        # examined_chars для потоковой обработки; None — резать поток нельзя
+        self.boundary = (set(old), False, False)
+        if kind == REGEX:
+            self.pattern = re.compile(old, REGEX_FLAGS)
+            self.boundary = None
+            if self.pattern.flags & re.IGNORECASE:
+                # Литерал без учёта регистра искать через "in" нельзя
+                self.literal = ""
+                return
+            try:
+                parsed = sre_parse.parse(old, REGEX_FLAGS)
+                self.literal = required_literal(parsed)
+                # Пустое совпадение на границе попало бы в оба куска
+                if parsed.getwidth()[0] > 0:
+                    self.boundary = examined_chars(parsed)
+                if unroll_leading_repeat(parsed):
+                    self.pattern = sre_compile.compile(parsed, REGEX_FLAGS)
+            except (re.error, TypeError, ValueError, AttributeError, IndexError):
+                # Внутреннее устройство re недоступно — обычный шаблон
+                self.literal = ""
+                self.boundary = None
+
+    def apply(self, text):
+        if self.kind == LITERAL:
+            return text.replace(self.old, self.new)
+        if self.literal and self.literal not in text:
+            return text
+        return self.pattern.sub(self.new, text)
+
+    def stream(self, pieces):
+        """apply для текста, поданного кусками. Остаток после последнего
+        безопасного места разреза переносится в следующий кусок"""
+        carry = ""
+        for piece in pieces:
+            # Места разреза внутри прежнего остатка уже проверены
+            low = max(1, len(carry))
+            carry += piece
+            cut = self.find_cut(carry, low)
+            if cut:
+                yield self.apply(carry[:cut])
+                carry = carry[cut:]
+        yield self.apply(carry)
+
+    def find_cut(self, text, low=1):
+        """Последняя позиция >= low, где text можно разрезать; 0 — негде"""
+        if self.boundary is None:
+            return 0
+        chars, begin, end = self.boundary
+        for cut in range(len(text) - 1, low - 1, -1):
+            before = text[cut - 1]
+            after = text[cut]
+            if before in chars or after in chars:
+                continue
+            # ^ в начале куска и $ в конце верны, только если там \n
+            if (begin and before != "\n") or (end and after != "\n"):
+                continue
+            return cut
+        return 0
+
+    def profile(self, text):
+        """apply с замером: (результат, RuleStat). Время учитывает только
+        сам проход; совпадения считаются отдельно"""
+        stat = RuleStat(self.kind, self.old, self.new)
+        started = time.perf_counter()
+        result = self.apply(text)
+        stat.seconds = time.perf_counter() - started
+
+        if self.kind == LITERAL:
+            stat.matches = text.count(self.old)
+            stat.removed = stat.matches * len(self.old.encode("utf-8"))
+            stat.added = stat.matches * len(self.new.encode("utf-8"))
+        elif result is not text:
+            for match in self.pattern.finditer(text):
+                stat.matches += 1
+                stat.removed += len(match.group().encode("utf-8"))
+                stat.added += len(match.expand(self.new).encode("utf-8"))
+        return result, stat
+
+    def apply_reference(self, text):
+        if self.kind == LITERAL:
+            return text.replace(self.old, self.new)
+        return re.sub(self.old, self.new, text, flags=REGEX_FLAGS)
+
+
+class RuleSet:
+    def __init__(self, rules):
+        self.rules = rules
+
+    @classmethod
+    def from_table(cls, table):
+        """Правила из словаря {"simple": {...}, "regex": {...}, "cleanup": {...}}:
+        сначала простые замены, затем регулярки, затем чистка"""
+        rules = [Rule(LITERAL, old, new) for old, new in table.get("simple", {}).items()]
+        rules += [Rule(REGEX, old, new) for old, new in table.get("regex", {}).items()]
+        rules += [Rule(LITERAL, old, new) for old, new in table.get("cleanup", {}).items()]
+        return cls(rules)
+
+    def apply(self, text):
+        for rule in self.rules:
+            text = rule.apply(text)
+        return text
+
+    def stream(self, pieces):
+        """Потоковый apply: каждое правило — звено цепочки генераторов"""
+        for rule in self.rules:
+            pieces = rule.stream(pieces)
+        return pieces
+
+    def profile(self, text):
+        """Профилирующий режим: (результат, [RuleStat по каждому правилу])"""
+        stats = []
+        for rule in self.rules:
+            text, stat = rule.profile(text)
+            stats.append(stat)
+        return text, stats
+
+    def apply_reference(self, text):
+        """Эталон: каждое правило через str.replace / re.sub без подготовки"""
+        for rule in self.rules:
+            text = rule.apply_reference(text)
+        return text
+
+
+def validate_table(table, source, allow_remove=False):
+    """Проверяет таблицу правил, прочитанную из source; бросает RulesError"""
+    if not isinstance(table, dict):
+        raise RulesError(f"{source}: ожидается объект с разделами {', '.join(SECTIONS)}")
+    for section, rules in table.items():
+        if section not in SECTIONS:
+            raise RulesError(f"{source}: неизвестный раздел {section!r}")
+        if not isinstance(rules, dict):
+            raise RulesError(f"{source}: {section}: ожидается объект {{строка: замена}}")
+        for old, new in rules.items():
+            where = f"{source}: {section}: правило {old!r}"
+            if not old:
+                raise RulesError(f"{where}: пустой шаблон")
+            if new is None and allow_remove:
+                continue
+            if not isinstance(new, str):
+                raise RulesError(f"{where}: замена должна быть строкой")
+            if section != "regex":
+                continue
+            try:
+                # sub на пустой строке разбирает и шаблон замены
+                re.compile(old, REGEX_FLAGS).sub(new, "")
+            except (re.error, IndexError) as e:
+                raise RulesError(f"{where}: {e}") from e
+    return table
+
+
+def read_table(path, allow_remove=False):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            table = json.load(f)
+    except (OSError, ValueError) as e:
+        # ValueError — ошибки JSON и кодировки
+        raise RulesError(f"{path}: {e}") from e
+    return validate_table(table, path, allow_remove)
+
+
+def merge_tables(base, override):
+    """Правила override поверх base: замена меняется на месте, новые правила
+    добавляются в конец раздела, null удаляет правило"""
+    merged = {}
+    for section in SECTIONS:
+        rules = dict(base.get(section, {}))
+        for old, new in override.get(section, {}).items():
+            if new is None:
+                rules.pop(old, None)
+            else:
+                rules[old] = new
+        merged[section] = rules
+    return merged
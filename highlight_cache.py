@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from markdown_tokenizer import HIGHLIGHTER_VERSION
+from toc_list import INDENTS
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "md_editor", "highlight")
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+
+class HighlightCache:
+    """Дисковый кэш подсветки и оглавления.
+
+    Ключ — хэш содержимого файла вместе с версией подсветки, поэтому изменённый
+    файл или новые правила просто не находят старую запись. Каждая запись —
+    отдельный JSON-файл; при превышении max_bytes удаляются давно не
+    использованные (по времени изменения файла, которое обновляется при чтении).
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key_for(text):
+        digest = hashlib.sha256(text.encode("utf-8"))
+        digest.update(f"\0v{HIGHLIGHTER_VERSION}".encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, key):
+        """Возвращает запись {"spans", "states", "outline"} или None"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self._discard(path)
+            return None
+
+        if not self._is_valid(entry, key):
+            self._discard(path)
+            return None
+
+        # Отметка об использовании для вытеснения давно не нужных записей
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return {
+            "spans": entry["spans"],
+            "states": self._expand_states(entry["states"]),
+            "outline": [tuple(item) for item in entry["outline"]],
+        }
+
+    def store(self, key, lines, outline):
+        """Сохраняет результат разбора: lines — (строка, спаны, состояние)"""
+        spans = {}
+        for line_number, line_spans, _ in lines:
+            for tag, start, end in line_spans:
+                spans.setdefault(tag, []).extend((line_number, start, end))
+
+        entry = {
+            "version": HIGHLIGHTER_VERSION,
+            "key": key,
+            "spans": spans,
+            "states": self._compress_states([state for _, _, state in lines]),
+            "outline": outline,
+        }
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Запись через временный файл, чтобы не оставить обрезанный JSON
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            self._discard(tmp_path)
+            return
+        except BaseException:
+            self._discard(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Удаляет самые давно использованные записи сверх max_bytes"""
+        entries = []
+        total = 0
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._discard(path)
+            total -= size
+
+    @staticmethod
+    def _discard(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _is_valid(entry, key):
+        try:
+            if entry["version"] != HIGHLIGHTER_VERSION or entry["key"] != key:
+                return False
+            for tag, flat in entry["spans"].items():
+                if len(flat) % 3 or not all(type(v) is int for v in flat):
+                    return False
+            for state, count in entry["states"]:
+                if not isinstance(state, str) or type(count) is not int:
+                    return False
+            for line, level, title in entry["outline"]:
+                if type(line) is not int or type(level) is not int:
+                    return False
+                # Оглавление берёт отступ по уровню: чужой уровень — промах
+                if level not in INDENTS:
+                    return False
+                if not isinstance(title, str):
+                    return False
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return False
+        return True
+
+    @staticmethod
+    def _compress_states(states):
+        """Состояния строк хранятся сериями: [[состояние, число строк], ...]"""
+        runs = []
+        for state in states:
+            if runs and runs[-1][0] == state:
+                runs[-1][1] += 1
+            else:
+                runs.append([state, 1])
+        return runs
+
+    @staticmethod
+    def _expand_states(runs):
+        states = []
+        for state, count in runs:
+            states.extend([state] * count)
+        return states
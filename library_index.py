@@ -0,0 +1,217 @@
+"""Полнотекстовый индекс библиотеки Markdown-файлов (SQLite FTS5).
+
+Каждый файл разбивается на разделы по заголовкам (как в оглавлении
+TOCList); раздел хранится с цепочкой заголовков, в которую он входит.
+Файлы учитываются по пути и времени изменения, поэтому повторная
+индексация затрагивает только изменённые файлы.
+
+Командная строка:
+    python library_index.py rebuild <папка>
+    python library_index.py update <папка>
+    python library_index.py search <запрос> [--folder папка] [--limit N]
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+
+from library_search import list_markdown_files
+from toc_list import parse_outline
+
+INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "md_editor", "library.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS sections USING fts5(
+    path UNINDEXED,
+    line UNINDEXED,
+    heading,
+    body,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+class LibraryIndexError(Exception):
+    pass
+
+
+def split_sections(text):
+    """Разделы текста: (строка начала, цепочка заголовков, текст раздела)"""
+    lines = text.split("\n")
+    outline = parse_outline(lines)
+
+    sections = []
+    if not outline or outline[0][0] > 1:
+        end = outline[0][0] - 1 if outline else len(lines)
+        sections.append((1, "", "\n".join(lines[:end])))
+
+    # Цепочка заголовков верхних уровней: уровень -> название
+    chain = {}
+    for i, (line, level, title) in enumerate(outline):
+        chain = {lvl: name for lvl, name in chain.items() if lvl < level}
+        chain[level] = title.strip()
+        end = outline[i + 1][0] - 1 if i + 1 < len(outline) else len(lines)
+        heading = " / ".join(chain[lvl] for lvl in sorted(chain))
+        sections.append((line, heading, "\n".join(lines[line:end])))
+    return sections
+
+
+def fts_query(query):
+    """Запрос пользователя для FTS5: слова и фразы в кавычках, все обязательны,
+    слово со звёздочкой на конце ищется по префиксу. Операторы FTS5 не
+    передаются, чтобы ввод не ломал синтаксис запроса"""
+    terms = []
+    for phrase, word in re.findall(r'"([^"]+)"|(\S+)', query):
+        term = (phrase or word).replace('"', "")
+        prefix = not phrase and term.endswith("*")
+        term = term.rstrip("*")
+        if term:
+            terms.append(f'"{term}"*' if prefix else f'"{term}"')
+    return " ".join(terms)
+
+
+class LibraryIndex:
+    def __init__(self, db_path=INDEX_PATH):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        try:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            self.db.close()
+            raise LibraryIndexError(f"SQLite без поддержки FTS5: {e}") from e
+
+    def close(self):
+        self.db.close()
+
+    def update_file(self, path):
+        """Переиндексирует файл, если он изменился; возвращает True при изменении"""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.remove_file(path)
+            return True
+
+        row = self.db.execute(
+            "SELECT mtime, size FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row == (stat.st_mtime, stat.st_size):
+            return False
+
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError:
+            return False
+
+        with self.db:
+            self.db.execute("DELETE FROM sections WHERE path = ?", (path,))
+            self.db.executemany(
+                "INSERT INTO sections (path, line, heading, body) VALUES (?, ?, ?, ?)",
+                ((path, line, heading, body) for line, heading, body in split_sections(text)),
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO files (path, mtime, size) VALUES (?, ?, ?)",
+                (path, stat.st_mtime, stat.st_size),
+            )
+        return True
+
+    def remove_file(self, path):
+        with self.db:
+            self.db.execute("DELETE FROM sections WHERE path = ?", (path,))
+            self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def indexed_paths(self, folder):
+        prefix = os.path.join(os.path.abspath(folder), "")
+        rows = self.db.execute(
+            "SELECT path FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix)
+        )
+        return [path for (path,) in rows]
+
+    def update_folder(self, folder):
+        """Приводит индекс папки в соответствие с диском: (обновлено, удалено)"""
+        paths = [os.path.abspath(path) for path in list_markdown_files(folder)]
+        updated = sum(self.update_file(path) for path in paths)
+
+        existing = set(paths)
+        removed = 0
+        for path in self.indexed_paths(folder):
+            if path not in existing:
+                self.remove_file(path)
+                removed += 1
+        return updated, removed
+
+    def rebuild(self, folder):
+        """Индексирует папку заново"""
+        for path in self.indexed_paths(folder):
+            self.remove_file(path)
+        return self.update_folder(folder)
+
+    def search(self, query, folder=None, limit=100):
+        """Разделы по релевантности: [(путь, строка, заголовки, фрагмент)]"""
+        match = fts_query(query)
+        if not match:
+            return []
+        sql = (
+            "SELECT path, line, heading, snippet(sections, 3, '[', ']', '…', 12) "
+            "FROM sections WHERE sections MATCH ?"
+        )
+        params = [match]
+        if folder:
+            prefix = os.path.join(os.path.abspath(folder), "")
+            sql += " AND substr(path, 1, ?) = ?"
+            params += [len(prefix), prefix]
+        sql += " ORDER BY bm25(sections, 0, 0, 2.0, 1.0) LIMIT ?"
+        params.append(limit)
+        return [
+            (path, int(line), heading, snippet)
+            for path, line, heading, snippet in self.db.execute(sql, params)
+        ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Индекс библиотеки Markdown-файлов")
+    parser.add_argument("--db", default=INDEX_PATH, help="файл индекса")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild", help="проиндексировать папку заново")
+    rebuild.add_argument("folder")
+    update = commands.add_parser("update", help="переиндексировать изменённые файлы")
+    update.add_argument("folder")
+    search = commands.add_parser("search", help="поиск по индексу")
+    search.add_argument("query")
+    search.add_argument("--folder")
+    search.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args(argv)
+    try:
+        index = LibraryIndex(args.db)
+    except LibraryIndexError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    try:
+        if args.command in ("rebuild", "update"):
+            action = index.rebuild if args.command == "rebuild" else index.update_folder
+            updated, removed = action(args.folder)
+            print(f"Обновлено файлов: {updated}, удалено: {removed}")
+        else:
+            for path, line, heading, snippet in index.search(
+                args.query, args.folder, args.limit
+            ):
+                print(f"{path}:{line}: [{heading}] {' '.join(snippet.split())}")
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import mmap
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+from correction_rules import required_literal as pattern_literal
+from search_utils import LineOffsets, compile_pattern
+
+# Не больше стольких совпадений из одного файла
+MAX_MATCHES_PER_FILE = 1000
+# Период опроса завершённых файлов, мс
+POLL_MS = 50
+
+
+def required_literal(term, use_regex=False):
+    """Подстрока, без которой совпадение невозможно, или "" если её не найти.
+
+    Регулярное выражение разбирается тем же sre_parse, что и в re, поэтому
+    экранирования (\\x41, \\101, \\u0410) и классы вроде [^]…] понимаются
+    так же, как при поиске.
+    """
+    if not use_regex:
+        return term
+    try:
+        flags = re.compile(term).flags
+        parsed = sre_parse.parse(term)
+    except (re.error, RecursionError):
+        return ""
+    # (?i) в начале шаблона: литерал нельзя искать с учётом регистра
+    if flags & re.IGNORECASE:
+        return ""
+    return pattern_literal(parsed)
+
+
+def may_match(path, literal, match_case):
+    """Быстрая проверка по байтам файла через mmap, без декодирования"""
+    if not literal:
+        return True
+    needle = literal.encode("utf-8")
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if match_case:
+                return data.find(needle) != -1
+            if literal.isascii():
+                return re.search(re.escape(needle), data, re.IGNORECASE) is not None
+    # Регистронезависимо для не-ASCII по байтам не проверить
+    return True
+
+
+def search_file(path, term, use_regex=False, match_case=False):
+    """Ищет в одном файле; возвращает (путь, [(строка, столбец, текст строки)], ошибка)"""
+    try:
+        if not may_match(path, required_literal(term, use_regex), match_case):
+            return path, [], None
+        pattern = compile_pattern(term, use_regex, match_case)
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+    except (OSError, ValueError, re.error) as e:
+        return path, [], str(e)
+
+    lines = text.split("\n")
+    offsets = LineOffsets(text)
+    matches = []
+    for match in pattern.finditer(text):
+        line = offsets.line_of(match.start())
+        matches.append((line, match.start() - offsets.starts[line - 1], lines[line - 1]))
+        if len(matches) >= MAX_MATCHES_PER_FILE:
+            break
+    return path, matches, None
+
+
+def list_markdown_files(folder):
+    """Все .md файлы папки и подпапок, по порядку"""
+    paths = []
+    for root, dirs, files in os.walk(folder):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(".md"))
+    return paths
+
+
+class PoolJob:
+    """Выполнение функции над набором файлов в пуле процессов.
+
+    tasks — список кортежей аргументов func, первый из них — путь к файлу.
+    Результаты по мере готовности передаются в on_result(результат), по
+    окончании вызывается on_done(). Если задача упала в процессе-работнике,
+    в on_result уходит error_result(путь, текст ошибки). Опрос идёт через
+    after() виджета, поэтому колбэки выполняются в потоке Tk.
+    """
+
+    def __init__(self, widget, func, tasks, on_result, on_done, error_result):
+        self.widget = widget
+        self.on_result = on_result
+        self.on_done = on_done
+        self.error_result = error_result
+        self._executor = ProcessPoolExecutor(
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        # Задача -> путь к файлу, для отчёта об ошибке
+        self._pending = {self._executor.submit(func, *args): args[0] for args in tasks}
+        self._job = widget.after(POLL_MS, self._poll)
+
+    @property
+    def running(self):
+        return self._job is not None
+
+    def cancel(self):
+        """Прерывает задачи без вызова on_done.
+
+        Отмена задач не трогает уже запущенные, поэтому процессы-работники
+        снимаются: шаблон с катастрофическим перебором не должен грузить
+        процессор после отмены.
+        """
+        if self._job:
+            self.widget.after_cancel(self._job)
+            self._job = None
+        # shutdown() обнуляет список процессов, поэтому он берётся заранее
+        processes = list((self._executor._processes or {}).values())
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    def _poll(self):
+        self._job = None
+        done = [future for future in self._pending if future.done()]
+        for future in done:
+            path = self._pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                # Ошибка работника (в том числе упавший пул) — ошибка файла
+                result = self.error_result(path, str(e) or type(e).__name__)
+            self.on_result(result)
+
+        if not self._pending:
+            self._executor.shutdown(wait=False)
+            self.on_done()
+            return
+        self._job = self.widget.after(POLL_MS, self._poll)
+
+
+class LibrarySearch(PoolJob):
+    """Поиск по всем Markdown-файлам папки в пуле процессов.
+
+    Результаты по мере готовности файлов передаются в
+    on_results(путь, совпадения); по окончании вызывается on_done(ошибки),
+    где ошибки — список (путь, текст ошибки).
+    """
+
+    def __init__(self, widget, folder, term, use_regex, match_case, on_results, on_done):
+        self.on_results = on_results
+        self.on_search_done = on_done
+        self.errors = []
+        self.paths = list_markdown_files(folder)
+        super().__init__(
+            widget,
+            search_file,
+            [(path, term, use_regex, match_case) for path in self.paths],
+            self._add_result,
+            lambda: self.on_search_done(self.errors),
+            lambda path, error: (path, [], error),
+        )
+
+    def _add_result(self, result):
+        path, matches, error = result
+        if error:
+            self.errors.append((path, error))
+        elif matches:
+            self.on_results(path, matches)
@@ -0,0 +1,226 @@
+import os
+import re
+import sqlite3
+import threading
+import tkinter as tk
+from tkinter import filedialog
+
+from dialog_manager import DialogManager
+from library_index import LibraryIndex, LibraryIndexError
+from library_search import LibrarySearch
+from search_utils import compile_pattern
+
+# Длина строки контекста в списке результатов
+CONTEXT_WIDTH = 200
+# Сколько разделов возвращает поиск по индексу
+INDEX_RESULTS_LIMIT = 500
+# Период проверки завершения поиска по индексу, мс
+INDEX_POLL_MS = 50
+
+
+class LibrarySearchDialog:
+    """Поиск по всем Markdown-файлам папки; клик по результату открывает файл"""
+
+    def __init__(self, root, open_match, folder=""):
+        # open_match(путь, строка, столбец) — открытие найденного места
+        self.open_match = open_match
+        self.results = []
+        self.search = None
+        # Ожидаемый результат поиска по индексу; устаревшие отбрасываются
+        self._index_result = None
+        self.folder = folder
+
+        self.win = tk.Toplevel(root)
+        self.win.title("Поиск по папке")
+        self.win.transient(root)
+
+        folder_frame = tk.Frame(self.win)
+        folder_frame.pack(side=tk.TOP, fill=tk.X)
+        tk.Label(folder_frame, text="Папка:").pack(side=tk.LEFT, padx=5, pady=5)
+        self.folder_var = tk.StringVar(value=folder)
+        tk.Entry(folder_frame, textvariable=self.folder_var, width=60).pack(
+            side=tk.LEFT, fill=tk.X, expand=True, padx=5, pady=5
+        )
+        tk.Button(
+            folder_frame,
+            text="📂",
+            command=self.choose_folder,
+            font=("Noto Color Emoji", 10),
+        ).pack(side=tk.LEFT, padx=2)
+
+        search_frame = tk.Frame(self.win)
+        search_frame.pack(side=tk.TOP, fill=tk.X)
+        tk.Label(search_frame, text="Найти:").pack(side=tk.LEFT, padx=5, pady=5)
+        self.search_entry = tk.Entry(search_frame, width=40)
+        self.search_entry.pack(side=tk.LEFT, padx=5, pady=5)
+        self.search_entry.focus_set()
+
+        self.regex_var = tk.BooleanVar()
+        tk.Checkbutton(
+            search_frame, text="Регулярное выражение", variable=self.regex_var
+        ).pack(side=tk.LEFT, padx=5)
+        self.match_case_var = tk.BooleanVar()
+        tk.Checkbutton(
+            search_frame, text="С учетом регистра", variable=self.match_case_var
+        ).pack(side=tk.LEFT, padx=5)
+        # Поиск слов и фраз по полнотекстовому индексу вместо сканирования файлов
+        self.use_index_var = tk.BooleanVar()
+        tk.Checkbutton(
+            search_frame, text="По индексу", variable=self.use_index_var
+        ).pack(side=tk.LEFT, padx=5)
+
+        tk.Button(
+            search_frame,
+            text="🔎",
+            command=self.start_search,
+            font=("Noto Color Emoji", 10),
+        ).pack(side=tk.LEFT, padx=2)
+        tk.Button(
+            search_frame,
+            text="⏹",
+            command=self.cancel_search,
+            font=("Noto Color Emoji", 10),
+        ).pack(side=tk.LEFT, padx=2)
+
+        list_frame = tk.Frame(self.win)
+        list_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.results_list = tk.Listbox(
+            list_frame, width=100, height=25, activestyle="none", exportselection=False
+        )
+        scroll = tk.Scrollbar(
+            list_frame, orient=tk.VERTICAL, command=self.results_list.yview
+        )
+        self.results_list.configure(yscrollcommand=scroll.set)
+        self.results_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scroll.pack(side=tk.LEFT, fill=tk.Y)
+
+        self.status_label = tk.Label(self.win, anchor="w")
+        self.status_label.pack(side=tk.TOP, fill=tk.X, padx=5)
+
+        self.results_list.bind("<ButtonRelease-1>", self.on_select)
+        self.results_list.bind("<Return>", self.on_select)
+        self.search_entry.bind("<Return>", lambda e: self.start_search())
+        self.win.bind("<Escape>", lambda e: self.close())
+        self.win.protocol("WM_DELETE_WINDOW", self.close)
+
+    def choose_folder(self):
+        folder = filedialog.askdirectory(
+            title="Выбери папку с md файлами", initialdir=self.folder_var.get() or None
+        )
+        if folder:
+            self.folder_var.set(folder)
+
+    def start_search(self):
+        self.cancel_search()
+        term = self.search_entry.get()
+        self.folder = self.folder_var.get()
+        if not term:
+            return
+        if not os.path.isdir(self.folder):
+            DialogManager.show_dialog("Ошибка", "Папка не найдена")
+            return
+        if self.use_index_var.get():
+            self.start_index_search(term)
+            return
+        try:
+            compile_pattern(term, self.regex_var.get(), self.match_case_var.get())
+        except re.error as e:
+            DialogManager.show_dialog("Ошибка RegEx", str(e))
+            return
+
+        self.results.clear()
+        self.results_list.delete(0, tk.END)
+        self.search = LibrarySearch(
+            self.win,
+            self.folder,
+            term,
+            self.regex_var.get(),
+            self.match_case_var.get(),
+            self.add_results,
+            self.search_done,
+        )
+        self.status_label.config(text=f"Поиск в {len(self.search.paths)} файлах…")
+
+    def start_index_search(self, term):
+        """Обновляет индекс изменённых файлов папки и ищет по нему в потоке"""
+        self.results.clear()
+        self.results_list.delete(0, tk.END)
+        self.status_label.config(text="Обновление индекса…")
+        result = self._index_result = {}
+        thread = threading.Thread(
+            target=self._index_worker, args=(self.folder, term, result), daemon=True
+        )
+        thread.start()
+        self.win.after(INDEX_POLL_MS, self._poll_index, thread, result)
+
+    @staticmethod
+    def _index_worker(folder, term, result):
+        # У потока своё соединение с базой
+        try:
+            index = LibraryIndex()
+            try:
+                index.update_folder(folder)
+                result["rows"] = index.search(term, folder, INDEX_RESULTS_LIMIT)
+            finally:
+                index.close()
+        except (LibraryIndexError, sqlite3.Error, OSError) as e:
+            result["error"] = str(e)
+
+    def _poll_index(self, thread, result):
+        if result is not self._index_result or not self.win.winfo_exists():
+            return
+        if thread.is_alive():
+            self.win.after(INDEX_POLL_MS, self._poll_index, thread, result)
+            return
+        if "error" in result:
+            self.status_label.config(text="Ошибка индекса")
+            DialogManager.show_dialog("Ошибка индекса", result["error"], timeout=3000)
+            return
+
+        rows = result["rows"]
+        self.results.extend((path, line, 0) for path, line, _, _ in rows)
+        self.results_list.insert(
+            tk.END,
+            *(
+                f"{os.path.relpath(path, self.folder)}:{line}: [{heading}] "
+                f"{' '.join(snippet.split())[:CONTEXT_WIDTH]}"
+                for path, line, heading, snippet in rows
+            ),
+        )
+        self.status_label.config(text=f"Найдено разделов: {len(rows)}")
+
+    def cancel_search(self):
+        self._index_result = None
+        if self.search and self.search.running:
+            self.search.cancel()
+            self.status_label.config(text=f"Остановлено: {len(self.results)}")
+        self.search = None
+
+    def add_results(self, path, matches):
+        name = os.path.relpath(path, self.folder)
+        self.results.extend((path, line, col) for line, col, _ in matches)
+        self.results_list.insert(
+            tk.END,
+            *(
+                f"{name}:{line}: {text.strip()[:CONTEXT_WIDTH]}"
+                for line, _, text in matches
+            ),
+        )
+        self.status_label.config(text=f"Поиск… {len(self.results)}")
+
+    def search_done(self, errors):
+        self.search = None
+        files = len({path for path, _, _ in self.results})
+        status = f"Найдено: {len(self.results)} в {files} файлах"
+        if errors:
+            status += f", ошибок чтения: {len(errors)}"
+        self.status_label.config(text=status)
+
+    def on_select(self, event=None):
+        selection = self.results_list.curselection()
+        if selection and selection[0] < len(self.results):
+            self.open_match(*self.results[selection[0]])
+
+    def close(self):
+        self.cancel_search()
+        self.win.destroy()
@@ -2,11 +2,27 @@ import tkinter as tk
 
 
 class LineNumbers(tk.Canvas):
+    """Номера строк рядом с текстом.
+
+    Перерисовка откладывается до простоя и выполняется не чаще раза за цикл
+    событий. Текстовые элементы холста не пересоздаются, а переставляются и
+    переподписываются; если первая видимая строка, её смещение, размеры
+    виджета и кегль шрифта не изменились, перерисовка пропускается (после
+    правки текста нужно вызвать redraw(force=True)).
+    """
+
     def __init__(self, parent, *args, **kwargs):
         tk.Canvas.__init__(self, parent, *args, **kwargs)
         self.text_widget = None
         self.configure(width=50, highlightthickness=0)
 
+        # Пул текстовых элементов и их текущие (y, номер) для пропуска лишних вызовов
+        self._items = []
+        self._shown = []
+        self._last_view = None
+        self._force = False
+        self._redraw_job = None
+
     def attach(self, text_widget):
         self.text_widget = text_widget
         self.text_widget.bind("<Configure>", self.on_configure)
@@ -19,17 +35,56 @@ class LineNumbers(tk.Canvas):
     def on_key_release(self, event=None):
         self.redraw()
 
-    def redraw(self):
+    def redraw(self, force=False):
+        """Запрашивает перерисовку в ближайший простой"""
         if not self.text_widget:
             return
+        self._force = self._force or force
+        if not self._redraw_job:
+            self._redraw_job = self.after_idle(self._draw)
+
+    def _draw(self):
+        self._redraw_job = None
+        force, self._force = self._force, False
+
+        text = self.text_widget
+        first = text.index("@0,0")
+        first_dline = text.dlineinfo(first)
+        height = text.winfo_height()
+        # При переносе по словам ширина и кегль меняют высоты строк
+        font_size = text.tk.call("font", "actual", text.cget("font"), "-size")
+        view = (first, first_dline and first_dline[1], height, text.winfo_width(), font_size)
+        if not force and view == self._last_view:
+            return
+        self._last_view = view
+
+        # Номера и вертикальные позиции видимых строк
+        positions = []
+        line = int(first.split(".")[0])
+        dline = first_dline
+        while dline is not None and dline[1] < height:
+            positions.append((dline[1], line))
+            line += 1
+            dline = text.dlineinfo(f"{line}.0")
+
+        for n, (y, line) in enumerate(positions):
+            if n == len(self._items):
+                item = self.create_text(45, y, anchor="ne", text=line, fill="#666666")
+                self._items.append(item)
+                self._shown.append((y, line))
+                continue
+            item = self._items[n]
+            shown = self._shown[n]
+            if shown is None:
+                self.itemconfigure(item, state="normal")
+            if shown is None or shown[0] != y:
+                self.coords(item, 45, y)
+            if shown is None or shown[1] != line:
+                self.itemconfigure(item, text=line)
+            self._shown[n] = (y, line)
 
-        self.delete("all")
-        i = self.text_widget.index("@0,0")
-        while True:
-            dline = self.text_widget.dlineinfo(i)
-            if dline is None:
-                break
-            y = dline[1]
-            line_num = str(i).split(".")[0]
-            self.create_text(45, y, anchor="ne", text=line_num, fill="#666666")
-            i = self.text_widget.index(f"{i}+1line")
+        # Лишние элементы пула прячутся до следующего использования
+        for n in range(len(positions), len(self._items)):
+            if self._shown[n] is not None:
+                self.itemconfigure(self._items[n], state="hidden")
+                self._shown[n] = None
@@ -0,0 +1,85 @@
+import bisect
+
+
+class LineRangeSet:
+    """Множество номеров строк в виде отсортированных непересекающихся диапазонов"""
+
+    def __init__(self):
+        # Начала и концы диапазонов (концы включительно)
+        self._starts = []
+        self._ends = []
+
+    def __bool__(self):
+        return bool(self._starts)
+
+    def __contains__(self, line):
+        i = bisect.bisect_right(self._starts, line) - 1
+        return i >= 0 and line <= self._ends[i]
+
+    def __iter__(self):
+        return iter(zip(self._starts, self._ends))
+
+    def clear(self):
+        self._starts.clear()
+        self._ends.clear()
+
+    def add(self, first, last):
+        """Добавляет диапазон строк, сливая его с соседними"""
+        if first > last:
+            return
+        lo = bisect.bisect_left(self._ends, first - 1)
+        hi = bisect.bisect_right(self._starts, last + 1)
+        if lo < hi:
+            first = min(first, self._starts[lo])
+            last = max(last, self._ends[hi - 1])
+        self._starts[lo:hi] = [first]
+        self._ends[lo:hi] = [last]
+
+    def discard(self, first, last):
+        """Убирает диапазон строк без сдвига остальных"""
+        self.apply_edit(first, last, 0)
+
+    def first_from(self, line):
+        """Наименьшая строка множества, не меньшая line, или None"""
+        i = bisect.bisect_left(self._ends, line)
+        if i == len(self._ends):
+            return None
+        return max(line, self._starts[i])
+
+    def missing(self, first, last):
+        """Возвращает диапазоны внутри [first, last], которых нет в множестве"""
+        gaps = []
+        i = bisect.bisect_left(self._ends, first)
+        line = first
+        while line <= last:
+            if i >= len(self._starts) or self._starts[i] > last:
+                gaps.append((line, last))
+                break
+            if self._starts[i] > line:
+                gaps.append((line, self._starts[i] - 1))
+            line = self._ends[i] + 1
+            i += 1
+        return gaps
+
+    def apply_edit(self, first, last, delta):
+        """Учитывает правку: строки [first, last] выбрасываются,
+        строки после last сдвигаются на delta.
+
+        Переписываются только диапазоны, задевающие правку (их находит
+        bisect); хвост лишь сдвигается, а при delta == 0 не трогается"""
+        lo = bisect.bisect_left(self._ends, first)
+        hi = bisect.bisect_right(self._starts, last)
+        starts = []
+        ends = []
+        for start, end in zip(self._starts[lo:hi], self._ends[lo:hi]):
+            if start < first:
+                starts.append(start)
+                ends.append(first - 1)
+            if end > last:
+                starts.append(last + 1 + delta)
+                ends.append(end + delta)
+        if delta:
+            self._starts[hi:] = [start + delta for start in self._starts[hi:]]
+            self._ends[hi:] = [end + delta for end in self._ends[hi:]]
+        self._starts[lo:hi] = starts
+        self._ends[lo:hi] = ends
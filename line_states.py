@@ -0,0 +1,47 @@
+from line_ranges import LineRangeSet
+from markdown_tokenizer import START
+
+
+class LineStateCache:
+    """Кэш состояний лексера на конец каждой строки.
+
+    Правка помечает свои строки неизвестными (None), остальные состояния
+    сдвигаются вместе с текстом. Пересчёт идёт от первой неизвестной строки
+    и останавливается, как только новое состояние совпадёт с сохранённым.
+    """
+
+    def __init__(self):
+        # _states[i] — состояние на конец строки i + 1
+        self._states = [None]
+        self._unknown = LineRangeSet()
+        self._unknown.add(1, 1)
+
+    def reset(self, line_count):
+        """Все состояния неизвестны (новый текст)"""
+        self._states = [None] * line_count
+        self._unknown.clear()
+        self._unknown.add(1, line_count)
+
+    def apply_edit(self, first, last, delta):
+        """Старые строки [first, last] стали [first, last + delta]"""
+        new_last = max(first, last + delta)
+        self._states[first - 1 : last] = [None] * (new_last - first + 1)
+        self._unknown.apply_edit(first, last, delta)
+        self._unknown.add(first, new_last)
+
+    def get(self, line):
+        return self._states[line - 1]
+
+    def state_before(self, line):
+        return START if line == 1 else self._states[line - 2]
+
+    def store(self, first, states):
+        """Сохраняет состояния строк, начиная с first"""
+        if not states:
+            return
+        self._states[first - 1 : first - 1 + len(states)] = states
+        self._unknown.discard(first, first + len(states) - 1)
+
+    def first_unknown(self, after=0):
+        """Первая строка с неизвестным состоянием после строки after"""
+        return self._unknown.first_from(after + 1)
@@ -1,18 +1,25 @@
 #!/usr/bin/python
 import os
+import sqlite3
 import sys
 import tkinter as tk
 from tkinter import filedialog
 
+from batch_replace_dialog import BatchReplaceDialog
 from bnf_editor import BnfEditor
 from book_exporter import BookExporter
+from correction_profile_dialog import CorrectionProfileDialog
+from correction_rules import RulesError
 from dialog_manager import DialogManager
+from highlight_cache import HighlightCache
+from library_index import LibraryIndex, LibraryIndexError
+from library_search_dialog import LibrarySearchDialog
 from line_numbers import LineNumbers
 from markdown_text import MarkdownText
 from replace_dialog import ReplaceDialog
 from search_dialog import SearchDialog
 from text_corrector import TextCorrector
-from toc_list import TOCList
+from toc_list import TOCList, parse_outline
 from tooltip import ToolTip
 
 
@@ -25,6 +32,11 @@ class SideBySideEditor:
 
         self.orig_path = ""
 
+        # Кэш подсветки и оглавления на диске
+        self.highlight_cache = HighlightCache()
+        # Оглавление загружено из кэша: правки от загрузки файла его не меняют
+        self._skip_toc_edits = False
+
         # Верхний фрейм с заголовком и кнопками
         self.top_frame = tk.Frame(root)
         self.top_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -120,6 +132,33 @@ class SideBySideEditor:
         self.correct_button.pack(side=tk.LEFT, padx=(0, 5))
         ToolTip(self.correct_button, "Correct text")
 
+        self.profile_correction_button = tk.Button(
+            self.buttons_frame,
+            text="📊",
+            command=self.profile_correction,
+            font=("Noto Color Emoji", 12, "bold"),
+        )
+        self.profile_correction_button.pack(side=tk.LEFT, padx=(0, 5))
+        ToolTip(self.profile_correction_button, "Profile correction rules")
+
+        self.library_search_button = tk.Button(
+            self.buttons_frame,
+            text="🗂",
+            command=self.open_library_search,
+            font=("Noto Color Emoji", 12, "bold"),
+        )
+        self.library_search_button.pack(side=tk.LEFT, padx=(0, 5))
+        ToolTip(self.library_search_button, "Search in folder")
+
+        self.batch_replace_button = tk.Button(
+            self.buttons_frame,
+            text="🔁",
+            command=self.open_batch_replace,
+            font=("Noto Color Emoji", 12, "bold"),
+        )
+        self.batch_replace_button.pack(side=tk.LEFT, padx=(0, 5))
+        ToolTip(self.batch_replace_button, "Replace in folder")
+
         self.exit_button = tk.Button(
             self.buttons_frame,
             text="❌",
@@ -251,6 +290,9 @@ class SideBySideEditor:
         self.left_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
 
         self.left_text = MarkdownText(self.left_frame, wrap="word")
+        # Один корректор на всё время работы: он помнит абзацы после
+        # прошлого исправления и повторно правит только изменённые
+        self.text_corrector = TextCorrector(self.left_text)
         self.left_scroll = tk.Scrollbar(
             self.left_frame, command=self.on_scroll_left, width=15
         )
@@ -265,8 +307,8 @@ class SideBySideEditor:
         self.left_toc.pack(side=tk.LEFT, fill=tk.Y)
         self.left_toc_scroll.pack(side=tk.LEFT, fill=tk.Y)
 
-        self.left_text.bind("<<Modified>>", self.on_left_text_modified)
-        self.left_text.edit_modified(False)
+        # Подписка на правки текста (вставка, undo/redo, замены из диалогов)
+        self.left_text.add_change_listener(self.on_left_text_changed)
 
         # Фрейм для номеров строк + поле перехода
         left_num_frame = tk.Frame(self.left_frame)
@@ -298,34 +340,21 @@ class SideBySideEditor:
 
         self.left_text.configure(yscrollcommand=self.on_text_scroll_left)
 
-        self.left_text.bind("<<Modified>>", self.on_left_text_modified)
-        self.left_text.edit_modified(False)
-
         root.bind("<Control-f>", self.on_ctrl_f)
         root.bind("<Control-r>", self.on_ctrl_r)
 
-        self.left_text.bind("<<Paste>>", lambda e: self.update_left_text_async())
-        self.left_text.bind("<<Cut>>", lambda e: self.update_left_text_async())
-
         if len(sys.argv) > 1:
             file_path = sys.argv[1]
             self.load_md_file(file_path)
 
-    def update_left_text_async(self):
-        self.left_text.after(300, self.update_left_text)
+    def on_left_text_changed(self, edits):
+        self.left_line_numbers.redraw(force=True)
 
-    def update_left_text(self):
-        self.left_text.schedule_highlight_markdown()
-        self.left_toc.schedule_update()
+        if self._skip_toc_edits:
+            self._skip_toc_edits = False
+            return
 
-    def on_left_text_modified(self, *args):
-        self.left_text.on_text_modified()
-        line = int(self.left_text.index("insert").split(".")[0])
-        text = self.left_text.get(f"{line}.0", f"{line}.end").lstrip()
-        if text.startswith("#"):
-            self.left_toc.schedule_update()
-        elif self.left_toc.check_contains_text(text):
-            self.left_toc.schedule_update()
+        self.left_toc.apply_edits(edits)
 
     def open_metadata_dialog(self):
         if not self.orig_path:
@@ -355,12 +384,58 @@ class SideBySideEditor:
     def open_replace_dialog(self, text_frame):
         ReplaceDialog(self.root, text_frame)
 
+    def open_library_search(self):
+        folder = os.path.dirname(self.orig_path) if self.orig_path else ""
+        LibrarySearchDialog(self.root, self.open_library_match, folder)
+
+    def open_library_match(self, path, line, col):
+        """Открывает файл из результатов поиска по папке на найденном месте"""
+        if os.path.abspath(path) != os.path.abspath(self.orig_path or ""):
+            self.load_md_file(path)
+        index = f"{line}.{col}"
+        self.left_text.mark_set("insert", index)
+        self.left_text.see(index)
+        self.left_text.focus_set()
+        self.left_toc.update_selection_by_text_line(line)
+
+    def open_batch_replace(self):
+        folder = os.path.dirname(self.orig_path) if self.orig_path else ""
+        BatchReplaceDialog(
+            self.root, self.on_batch_replaced, folder, skip_path=self.has_unsaved_edits
+        )
+
+    def has_unsaved_edits(self, path):
+        """Файл path открыт в редакторе и там есть несохранённые правки"""
+        if not self.orig_path or os.path.abspath(path) != os.path.abspath(self.orig_path):
+            return False
+        return bool(self.left_text.edit_modified())
+
+    def on_batch_replaced(self, paths):
+        for path in paths:
+            self.update_library_index(path)
+        # Открытый файл изменён на диске — перечитываем. Файл с
+        # несохранёнными правками диалог не трогает, но проверим и здесь
+        current = os.path.abspath(self.orig_path or "")
+        if any(os.path.abspath(path) == current for path in paths):
+            if not self.left_text.edit_modified():
+                self.reload_md_files()
+
     def correct_text(self):
-        self.text_corrector = TextCorrector(self.left_text)
         self.text_corrector.correct_text(self.orig_path)
-        self.left_toc.schedule_update()
+
+    def profile_correction(self):
+        """Прогон автозамены с замерами по правилам; текст не меняется"""
+        text = self.left_text.get("1.0", tk.END).strip()
+        stats = []
+        try:
+            self.text_corrector.normalize_text(text, self.orig_path, stats)
+        except RulesError as e:
+            DialogManager.show_dialog("Ошибка в правилах", str(e), timeout=5000)
+            return
+        CorrectionProfileDialog(self.root, stats, self.orig_path)
 
     def on_text_scroll_left(self, *args):
+        self.left_text.view_changed()
         self.left_line_numbers.redraw()
         self.left_scroll.set(args[0], args[1])
 
@@ -448,10 +523,9 @@ class SideBySideEditor:
             self.left_text.delete("1.0", tk.END)
 
             self.left_text.insert(tk.END, original_lines)
+            self.left_text.edit_modified(False)
 
-            self.left_text.highlight_markdown()
-
-            self.left_toc.schedule_update()
+            self.highlight_loaded_text(original_lines)
 
             # Восстанавливаем прокрутку
             self.left_text.update_idletasks()  # опционально, но помогает
@@ -483,19 +557,36 @@ class SideBySideEditor:
 
             self.left_text.delete("1.0", tk.END)
             self.left_text.insert(tk.END, original_lines)
-            self.left_text.highlight_markdown()
+            self.left_text.edit_modified(False)
+            self.highlight_loaded_text(original_lines)
 
             self.left_text.mark_set("insert", "1.0")  # ставим курсор в начало
             self.left_text.see("insert")
             self.left_text.focus_set()
 
-            self.left_toc.schedule_update()
             # Обновляем заголовок после загрузки файлов
             self.update_file_title()
 
         except Exception as e:
             DialogManager.show_dialog("Ошибка", str(e))
 
+    def highlight_loaded_text(self, text):
+        """Подсветка и оглавление только что загруженного текста: из кэша,
+        если файл не менялся, иначе полный разбор с сохранением в кэш"""
+        key = self.highlight_cache.key_for(text)
+        entry = self.highlight_cache.load(key)
+        if entry and self.left_text.apply_highlight(entry["spans"], entry["states"]):
+            self.left_toc.set_outline(entry["outline"])
+            self._skip_toc_edits = True
+            return
+
+        def store(lines):
+            outline = parse_outline(text.split("\n"))
+            self.highlight_cache.store(key, lines, outline)
+
+        # Оглавление соберётся из правки загрузки через on_left_text_changed
+        self.left_text.highlight_markdown(on_complete=store)
+
     def adjust_scroll_to_position(self, text_widget, target_index, target_y):
         """Корректирует прокрутку, чтобы указанная позиция была на заданной высоте"""
         try:
@@ -548,12 +639,27 @@ class SideBySideEditor:
             # 🔹 СОХРАНЕНИЕ
             with open(self.orig_path, "w", encoding="utf-8") as f:
                 f.write("\n".join(original_text) + "\n")
+            self.left_text.edit_modified(False)
+
+            self.update_library_index(self.orig_path)
 
             DialogManager.show_dialog("Успех", "Файлы сохранены.")
 
         except Exception as e:
             DialogManager.show_dialog("Ошибка сохранения", str(e))
 
+    def update_library_index(self, path):
+        """Переиндексирует сохранённый файл в индексе библиотеки"""
+        try:
+            index = LibraryIndex()
+            try:
+                index.update_file(path)
+            finally:
+                index.close()
+        except (LibraryIndexError, sqlite3.Error, OSError):
+            # Индекс — вспомогательный: его ошибки не мешают сохранению
+            pass
+
     def highlight_current_line_left(self, event=None):
         # даём курсору переместиться, затем подсвечиваем
         self.root.after(
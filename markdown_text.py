@@ -1,16 +1,60 @@
-import re
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import font
 
+from line_ranges import LineRangeSet
+from line_states import LineStateCache
+from markdown_tokenizer import scan_state, tokenize_lines
+from tag_batch import TagBatch
+
 WORD_CHARS = r"[A-Za-zА-Яа-яЁё0-9_-]"
 SPACE_CHARS = r"\s"
 PUNCT_CHARS = r"[^\w\s]"
 
+# Теги, которые выставляет подсветка Markdown
+HIGHLIGHT_TAGS = (
+    "info",
+    "tag",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "bold",
+    "italic",
+    "bold_italic",
+    "code",
+    "link",
+    "list",
+    "code_block",
+    "blockquote",
+    "front_matter",
+)
+
+# Фоновая подсветка: строк в одном блоке от потока разбора,
+# бюджет применения за один шаг (мс) и пауза между шагами (мс)
+BACKGROUND_BLOCK_LINES = 200
+BACKGROUND_BUDGET_MS = 8
+BACKGROUND_POLL_MS = 10
+# Задержка перезапуска фоновой подсветки после правок (мс)
+BACKGROUND_RESTART_MS = 500
+# Сколько строк запрашивать за раз при пересчёте состояний лексера
+STATE_BLOCK_LINES = 1000
+
 
 class MarkdownText(tk.Text):
     """Кастомный Text виджет с подсветкой Markdown"""
 
-    def __init__(self, *args, **kwargs):
+    def __init__(
+        self,
+        *args,
+        lazy_highlight=True,
+        highlight_margin=200,
+        background_highlight=True,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.base_font = font.Font(family="Monospace", size=10)
         self.config(font=self.base_font)
@@ -18,7 +62,33 @@ class MarkdownText(tk.Text):
         self.configure(undo=True, maxundo=20)
         self.configure_tags()
         self.configure_bindings()
-        self._update_job = None
+
+        # Ленивая подсветка: только видимая область плюс highlight_margin строк
+        self.lazy_highlight = lazy_highlight
+        self.highlight_margin = highlight_margin
+        self._highlighted = LineRangeSet()
+        # Состояние лексера на конец каждой строки (блоки кода, цитаты)
+        self._states = LineStateCache()
+
+        # Статистика пакетной расстановки тегов (см. tag_batch)
+        self.tag_stats = {"ranges": 0, "calls": 0, "saved": 0}
+
+        # Отслеживание правок: строки, изменённые с последнего обновления подсветки
+        self._dirty = LineRangeSet()
+        self._edits = []
+        self._edit_job = None
+        # Правки пакета (begin_edits/end_edits) копятся одной: (first, last, delta)
+        self._batch = None
+        self._change_listeners = []
+        self._view_listeners = []
+        self.install_proxy()
+
+        # Фоновая подсветка всего документа; generation растёт с каждой правкой,
+        # результаты разбора устаревшего снимка текста отбрасываются
+        self.background_highlight = background_highlight
+        self.generation = 0
+        self._background_job = None
+        self._background_restart_job = None
 
     def configure_bindings(self):
         self.bind("<Control-b>", lambda e: self.format_line("bold"))
@@ -89,10 +159,148 @@ class MarkdownText(tk.Text):
         if size >= 8:
             self.base_font.configure(size=size)
 
-    def schedule_highlight_markdown(self):
-        if self._update_job:
-            self.after_cancel(self._update_job)
-        self._update_job = self.after(300, self.highlight_markdown)
+    def install_proxy(self):
+        """Подменяет команду виджета, чтобы видеть все insert/delete/replace,
+        включая вставку, undo/redo и правки из диалогов"""
+        self._orig = self._w + "_orig"
+        self.tk.call("rename", self._w, self._orig)
+        self.tk.createcommand(self._w, self._proxy)
+
+    def _proxy(self, command, *args):
+        if command not in ("insert", "delete", "replace"):
+            return self.tk.call((self._orig, command) + args)
+
+        # Строки, которые затрагивает правка (до её выполнения)
+        if command == "delete":
+            indexes = list(args)
+            if len(indexes) % 2:
+                # delete с одним индексом удаляет один символ — возможно,
+                # перевод строки, и тогда задета и следующая строка
+                indexes.append(f"{indexes[-1]} +1c")
+        else:
+            indexes = args[:1] if command == "insert" else args[:2]
+        lines = [
+            int(self.tk.call(self._orig, "index", i).split(".")[0]) for i in indexes
+        ]
+        lines_before = self._line_count()
+        # Индекс end лежит на строку ниже последней
+        first = min(min(lines), lines_before)
+        last = min(max(lines), lines_before)
+
+        result = self.tk.call((self._orig, command) + args)
+
+        delta = self._line_count() - lines_before
+        if self._batch is None:
+            self._record_edit(first, last, delta)
+        else:
+            self._merge_edit(first, last, delta)
+        return result
+
+    def _line_count(self):
+        return int(self.tk.call(self._orig, "index", "end-1c").split(".")[0])
+
+    def _record_edit(self, first, last, delta):
+        """Запоминает правку: старые строки [first, last] стали [first, last + delta]"""
+        new_last = max(first, last + delta)
+        self.generation += 1
+
+        self._highlighted.apply_edit(first, last, delta)
+        self._states.apply_edit(first, last, delta)
+        self._dirty.apply_edit(first, last, delta)
+        self._dirty.add(first, new_last)
+        self._edits.append((first, new_last, delta))
+
+        # Все правки за цикл событий обрабатываются одним отложенным вызовом
+        if not self._edit_job:
+            self._edit_job = self.after_idle(self._flush_edits)
+
+    def begin_edits(self):
+        """Начало пакета правок: вместо учёта каждой правки (сдвиг диапазонов
+        подсветки, оповещение оглавления) в end_edits учитывается одна,
+        охватывающая все строки пакета"""
+        self._batch = (None, None, 0)
+
+    def end_edits(self):
+        batch, self._batch = self._batch, None
+        if batch and batch[0] is not None:
+            self._record_edit(*batch)
+
+    def _merge_edit(self, first, last, delta):
+        """Добавляет правку (в текущих номерах строк) к пакету, который
+        хранит старые строки [first, last] и изменение их числа"""
+        batch_first, batch_last, batch_delta = self._batch
+        if batch_first is None:
+            self._batch = (first, last, delta)
+            return
+        # Строки до пакета не сдвигались, после него — сдвинуты на batch_delta
+        if last >= batch_first:
+            batch_last = max(batch_last, last - batch_delta)
+        self._batch = (min(batch_first, first), batch_last, batch_delta + delta)
+
+    def _flush_edits(self):
+        self._edit_job = None
+        edits, self._edits = self._edits, []
+
+        if self.lazy_highlight:
+            # Изменённые строки выпали из подсвеченных; видимые подсветятся заново
+            self.highlight_visible()
+            # Остальные догонит фоновая подсветка
+            if self.background_highlight and not self._background_job:
+                if self._highlighted.missing(1, self._line_count()):
+                    self.schedule_background_highlight()
+        else:
+            last_line = self._line_count()
+            for first, last in self._dirty:
+                if first <= last_line:
+                    self.highlight_lines(first, min(last, last_line))
+        self._dirty.clear()
+
+        for listener in list(self._change_listeners):
+            listener(edits)
+
+    def add_change_listener(self, callback):
+        """Подписка на правки: callback(edits), где edits — список
+        (первая строка, последняя строка, изменение числа строк)"""
+        self._change_listeners.append(callback)
+
+    def remove_change_listener(self, callback):
+        if callback in self._change_listeners:
+            self._change_listeners.remove(callback)
+
+    def add_view_listener(self, callback):
+        """Подписка на прокрутку: callback() после смены видимой области"""
+        self._view_listeners.append(callback)
+
+    def remove_view_listener(self, callback):
+        if callback in self._view_listeners:
+            self._view_listeners.remove(callback)
+
+    def view_changed(self):
+        """Вызывается при прокрутке: подсветка видимого и оповещение подписчиков"""
+        self.highlight_visible()
+        for listener in list(self._view_listeners):
+            listener()
+
+    def visible_lines(self):
+        """Первая и последняя видимые строки"""
+        first = int(self.index("@0,0").split(".")[0])
+        bottom = int(self.index(f"@0,{self.winfo_height()}").split(".")[0])
+        return first, bottom
+
+    def set_marks(self, marks):
+        """Ставит метки (имя, индекс, gravity) одним скриптом Tcl,
+        минуя перехват команд виджета"""
+        script = [
+            f"{self._orig} mark set {name} {index}\n"
+            f"{self._orig} mark gravity {name} {gravity}"
+            for name, index, gravity in marks
+        ]
+        if script:
+            self.tk.eval("\n".join(script))
+
+    def tag_batch(self):
+        """Пакет операций с тегами, который отправляется в Tcl минимумом вызовов"""
+        return TagBatch(self, self.tag_stats)
 
     def configure_tags(self):
         """Настройка стилей для Markdown-элементов"""
@@ -205,6 +413,27 @@ class MarkdownText(tk.Text):
             foreground="#4299e1",
             underline=True,
         )
+        # Многострочные блоки
+        self.tag_config(
+            "code_block",
+            font=("Courier", self.base_font.actual("size")),
+            background="#f0f0f0",
+        )
+        self.tag_config(
+            "blockquote",
+            foreground="#555555",
+            lmargin1=15,
+            lmargin2=15,
+        )
+        self.tag_config(
+            "front_matter",
+            font=font.Font(
+                family=self.base_font.actual("family"),
+                size=self.base_font.actual("size"),
+                slant="italic",
+            ),
+            foreground="#808080",
+        )
         # Списки
         self.tag_config(
             "list",
@@ -217,189 +446,240 @@ class MarkdownText(tk.Text):
             spacing1=5,
         )
 
-    def highlight_markdown(self, event=None):
-        """Подсветка Markdown-синтаксиса"""
+    def highlight_markdown(self, event=None, on_complete=None):
+        """Подсветка Markdown-синтаксиса.
+
+        on_complete(lines) вызывается из фонового потока, когда весь документ
+        разобран без промежуточных правок; lines — список
+        (номер строки, спаны в колонках, состояние на конец строки)."""
         # Очистка всех тегов перед повторной обработкой
-        for tag in self.tag_names():
-            if tag in (
-                "info",
-                "tag",
-                "h1",
-                "h2",
-                "h3",
-                "h4",
-                "h5",
-                "bold",
-                "italic",
-                "bold_italic",
-                "code",
-                "link",
-                "list",
-            ):
-                self.tag_remove(tag, "1.0", tk.END)
-
-        text = self.get("1.0", tk.END)
-        lines = text.split("\n")
-
-        # Обрабатываем построчно для многострочных паттернов
-        for i, line in enumerate(lines, 1):
-            line_start = f"{i}.0"
-            line_end = f"{i}.end"
-
-            # Заголовки
-            if re.match(r"^%\s", line):
-                self.tag_add("info", line_start, line_end)
-            elif re.match(r"^#\s", line):
-                self.tag_add("h1", line_start, line_end)
-            elif re.match(r"^##\s", line):
-                self.tag_add("h2", line_start, line_end)
-            elif re.match(r"^###\s", line):
-                self.tag_add("h3", line_start, line_end)
-            elif re.match(r"^####\s", line):
-                self.tag_add("h4", line_start, line_end)
-            elif re.match(r"^#####\s", line):
-                self.tag_add("h5", line_start, line_end)
-
-            # Списки
-            if re.match(r"^[\*\-\+]\s", line):
-                self.tag_add("list", line_start, line_end)
-
-        # Обрабатываем встроенные элементы (не зависящие от строк)
-        self.highlight_pattern(r"\*\*\*(.+?)\*\*\*", "bold_italic")
-        self.highlight_pattern(r"#([a-zA-Zа-яА-ЯёЁ_-]+?\s)", "tag")
-        self.highlight_pattern(r"\*\*(.+?)\*\*", "bold", exclude_tags=["bold_italic"])
-        self.highlight_pattern(
-            r"\*(.+?)\*", "italic", exclude_tags=["bold", "bold_italic"]
+        for tag in HIGHLIGHT_TAGS:
+            self.tag_remove(tag, "1.0", tk.END)
+        self._highlighted.clear()
+        self._dirty.clear()
+        self._states.reset(self._line_count())
+
+        if self.lazy_highlight:
+            self.highlight_visible()
+        if self.background_highlight:
+            self.start_background_highlight(on_complete)
+        elif not self.lazy_highlight:
+            self.highlight_lines(1, self._line_count())
+
+    def start_background_highlight(self, on_complete=None):
+        """Разбирает снимок текста в потоке и применяет результат порциями"""
+        if self._background_job:
+            self.after_cancel(self._background_job)
+        if self._background_restart_job:
+            self.after_cancel(self._background_restart_job)
+        self._background_restart_job = None
+
+        generation = self.generation
+        text = self.get("1.0", "end-1c")
+        results = queue.Queue()
+        threading.Thread(
+            target=self._background_tokenize,
+            args=(text, generation, results, on_complete),
+            daemon=True,
+        ).start()
+        self._background_job = self.after(
+            BACKGROUND_POLL_MS, self._apply_background, generation, results
         )
-        self.highlight_pattern(r"`(.+?)`", "code")
-        self.highlight_pattern(r"\[(.+?)\]\((.+?)\)", "link")
-
-    def on_text_modified(self, event=None):
-        if not self.edit_modified():
-            return
-
-        self.edit_modified(False)
 
-        line = int(self.index("insert").split(".")[0])
-        last = int(self.index("end-1c").split(".")[0])
-
-        for ln in (line - 2, line, line + 2):
-            if 1 <= ln <= last:
-                self.highlight_line(ln)
-
-    def highlight_line(self, line_number):
-        # Обрабатываем построчно для многострочных паттернов
-        line_start = f"{line_number}.0"
-        line_end = f"{line_number}.end"
-        text = self.get(line_start, line_end)
-
-        # Очистка всех тегов перед повторной обработкой
-        for tag in self.tag_names():
-            if tag in (
-                "info",
-                "tag",
-                "h1",
-                "h2",
-                "h3",
-                "h4",
-                "h5",
-                "bold",
-                "italic",
-                "bold_italic",
-                "code",
-                "link",
-                "list",
-            ):
-                self.tag_remove(tag, line_start, line_end)
+    def schedule_background_highlight(self):
+        if self._background_restart_job:
+            self.after_cancel(self._background_restart_job)
+        self._background_restart_job = self.after(
+            BACKGROUND_RESTART_MS, self.start_background_highlight
+        )
 
-        # Заголовки
-        if re.match(r"^%\s", text):
-            self.tag_add("info", line_start, line_end)
-        elif re.match(r"^#\s", text):
-            self.tag_add("h1", line_start, line_end)
-        elif re.match(r"^##\s", text):
-            self.tag_add("h2", line_start, line_end)
-        elif re.match(r"^###\s", text):
-            self.tag_add("h3", line_start, line_end)
-        elif re.match(r"^####\s", text):
-            self.tag_add("h4", line_start, line_end)
-        elif re.match(r"^#####\s", text):
-            self.tag_add("h5", line_start, line_end)
+    def _background_tokenize(self, text, generation, results, on_complete=None):
+        """Работает в отдельном потоке: виджет не трогает, только очередь"""
+        lines = []
+        block = []
+        for line in tokenize_lines(text):
+            block.append(line)
+            if len(block) == BACKGROUND_BLOCK_LINES:
+                if self.generation != generation:
+                    return
+                results.put(block)
+                if on_complete:
+                    lines.extend(block)
+                block = []
+        results.put(block)
+        results.put(None)
+
+        if on_complete and self.generation == generation:
+            lines.extend(block)
+            on_complete(lines)
+
+    def apply_highlight(self, spans, states):
+        """Применяет готовую подсветку всего документа (например, из кэша).
+
+        spans — {тег: [строка, начало, конец, ...]}, states — состояния на конец
+        каждой строки. Возвращает False, если данные не подходят к тексту."""
+        line_count = self._line_count()
+        if len(states) != line_count or not set(spans) <= set(HIGHLIGHT_TAGS):
+            return False
+
+        if self._background_job:
+            self.after_cancel(self._background_job)
+            self._background_job = None
+        for tag in HIGHLIGHT_TAGS:
+            self.tag_remove(tag, "1.0", tk.END)
+
+        with self.tag_batch() as batch:
+            for tag, flat in spans.items():
+                for i in range(0, len(flat), 3):
+                    line = flat[i]
+                    batch.add(tag, f"{line}.{flat[i + 1]}", f"{line}.{flat[i + 2]}")
+
+        self._dirty.clear()
+        self._states.reset(line_count)
+        self._states.store(1, states)
+        self._highlighted.clear()
+        self._highlighted.add(1, line_count)
+        return True
+
+    def _apply_background(self, generation, results):
+        self._background_job = None
+        if self.generation != generation:
+            # Текст изменился: результаты устарели, разбор начнётся заново
+            self.schedule_background_highlight()
+            return
 
-        # Списки
-        if re.match(r"^[\*\-\+]\s", text):
-            self.tag_add("list", line_start, line_end)
+        deadline = time.perf_counter() + BACKGROUND_BUDGET_MS / 1000
+        while time.perf_counter() < deadline:
+            try:
+                block = results.get_nowait()
+            except queue.Empty:
+                break
+            if block is None:
+                return
+            self._apply_block(block)
 
-        # Обрабатываем встроенные элементы (не зависящие от строк)
-        self.highlight_pattern(
-            r"\*\*\*(.+?)\*\*\*", "bold_italic", line_start, line_end
-        )
-        self.highlight_pattern(
-            r"\*\*(.+?)\*\*",
-            "bold",
-            line_start,
-            line_end,
-            exclude_tags=["bold_italic"],
-        )
-        self.highlight_pattern(
-            r"\*(.+?)\*",
-            "italic",
-            line_start,
-            line_end,
-            exclude_tags=["bold", "bold_italic"],
+        self._background_job = self.after(
+            BACKGROUND_POLL_MS, self._apply_background, generation, results
         )
-        self.highlight_pattern(r"#([a-zA-Zа-яА-ЯёЁ_-]+?\s)", "tag")
-        self.highlight_pattern(r"`(.+?)`", "code", line_start, line_end)
-        self.highlight_pattern(r"\[(.+?)\]\((.+?)\)", "link", line_start, line_end)
 
-    def highlight_pattern(
-        self, pattern, tag, start="1.0", end="end", exclude_tags=None
-    ):
-        """Подсветка без перекрытия с другими тегами"""
-        if exclude_tags is None:
-            exclude_tags = []
+    def _apply_block(self, block):
+        """Применяет разобранные строки, пропуская уже подсвеченные"""
+        if not block:
+            return
+        # Снимок разобран от начала документа, его состояния верны для всех строк
+        self._states.store(block[0][0], [state for _, _, state in block])
+        by_line = {n: spans for n, spans, _ in block}
+        with self.tag_batch() as batch:
+            for first, last in self._highlighted.missing(block[0][0], block[-1][0]):
+                for tag in HIGHLIGHT_TAGS:
+                    batch.remove(tag, f"{first}.0", f"{last}.end")
+                for n in range(first, last + 1):
+                    for tag, start, end in by_line[n]:
+                        batch.add(tag, f"{n}.{start}", f"{n}.{end}")
+                self._highlighted.add(first, last)
+
+    def highlight_visible(self):
+        """Подсвечивает видимую область (с запасом), пропуская уже подсвеченные строки"""
+        first, bottom = self.visible_lines()
+        last = int(self.index("end-1c").split(".")[0])
 
-        start = self.index(start)
-        end = self.index(end)
-        self.mark_set("matchStart", start)
-        self.mark_set("matchEnd", start)
-        self.mark_set("searchLimit", end)
+        first = max(1, first - self.highlight_margin)
+        bottom = min(last, bottom + self.highlight_margin)
 
-        count = tk.IntVar()
+        # Строки, у которых сменилось входное состояние, выпадут из подсвеченных
+        self._ensure_states(bottom)
+        # Подсветка может снять с подсветки следующие строки, поэтому пересчёт
         while True:
-            index = self.search(
-                pattern,
-                index="matchEnd",
-                stopindex="searchLimit",
-                count=count,
-                regexp=True,
-            )
-            if index == "":
-                break
-            if count.get() == 0:
+            gaps = self._highlighted.missing(first, bottom)
+            if not gaps:
                 break
+            self.highlight_lines(*gaps[0])
+
+    def highlight_lines(self, first, last):
+        """Подсветка диапазона строк [first, last]"""
+        range_start = f"{first}.0"
+        range_end = f"{last}.end"
+
+        self._ensure_states(first - 1)
+        state = self._states.state_before(first)
+        old_end_state = self._states.get(last)
+
+        # Один запрос текста, разбор целиком на стороне Python
+        text = self.get(range_start, range_end)
+
+        states = []
+        with self.tag_batch() as batch:
+            # Очистка всех тегов перед повторной обработкой
+            for tag in HIGHLIGHT_TAGS:
+                batch.remove(tag, range_start, range_end)
+            for n, spans, state in tokenize_lines(text, first, state):
+                for tag, start, end in spans:
+                    batch.add(tag, f"{n}.{start}", f"{n}.{end}")
+                states.append(state)
+
+        self._states.store(first, states)
+        self._highlighted.add(first, last)
+
+        # Состояние на выходе изменилось: следующие строки пересчитываются,
+        # пока состояние не сойдётся с кэшем
+        if state != old_end_state and last < self._line_count():
+            stale = self._relex_states(last + 1, last, old_end_state)
+            if not self.lazy_highlight:
+                for start, end in stale:
+                    self.highlight_lines(start, end)
+
+    def _ensure_states(self, upto):
+        """Досчитывает неизвестные состояния строк вплоть до upto"""
+        line = self._states.first_unknown()
+        if line is not None and line <= upto:
+            self._relex_states(
+                line, upto, self._states.state_before(line), fill_unknown=True
+            )
 
-            match_start = index
-            match_end = f"{index}+{count.get()}c"
-
-            # Проверяем, есть ли запрещённые теги
-            overlap = False
-            for t in exclude_tags:
-                if self.tag_ranges(t):  # Есть ли теги вообще
-                    ranges = self.tag_ranges(t)
-                    for i in range(0, len(ranges), 2):
-                        if self.compare(match_start, ">=", ranges[i]) and self.compare(
-                            match_start, "<", ranges[i + 1]
-                        ):
-                            overlap = True
-                            break
-                if overlap:
+    def _relex_states(self, line, upto, prev_old, fill_unknown=False):
+        """Пересчитывает состояния начиная с line, пока новое состояние не совпадёт
+        с сохранённым. prev_old — прежнее состояние на конец предыдущей строки.
+
+        После upto пересчёт идёт только по строкам с известным (возможно
+        устаревшим) состоянием: неизвестные строки не подсвечены и досчитаются
+        позже. С fill_unknown после схождения пересчёт продолжается со следующей
+        неизвестной строки до upto. Строки, у которых изменилось входное
+        состояние, снимаются с подсветки; возвращается их множество."""
+        stale = LineRangeSet()
+        line_count = self._line_count()
+        state = self._states.state_before(line)
+        while line <= line_count:
+            block_end = min(line_count, line + STATE_BLOCK_LINES - 1)
+            lines = self.get(f"{line}.0", f"{block_end}.end").split("\n")
+            states = []
+            stop = False
+            for n, text in enumerate(lines, line):
+                old = self._states.get(n)
+                if n > upto and old is None:
+                    stop = True
                     break
+                if prev_old != state and n in self._highlighted:
+                    stale.add(n, n)
+                state = scan_state(text, state)
+                states.append(state)
+                prev_old = old
+                if old == state:
+                    stop = True
+                    break
+            self._states.store(line, states)
+            line += len(states)
 
-            if not overlap:
-                self.tag_add(tag, match_start, match_end)
+            if stop:
+                if not fill_unknown:
+                    break
+                line = self._states.first_unknown(line - 1)
+                if line is None or line > upto:
+                    break
+                state = prev_old = self._states.state_before(line)
 
-            self.mark_set("matchEnd", match_end)
+        for start, end in stale:
+            self._highlighted.discard(start, end)
+        return stale
 
     def format_line(self, style):
         """Применяет форматирование к строке с курсором"""
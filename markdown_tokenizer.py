@@ -0,0 +1,141 @@
+import bisect
+import re
+
+# Версия правил подсветки: менять при любом изменении результата разбора,
+# иначе сохранённая на диске подсветка (highlight_cache) устареет незаметно
+HIGHLIGHTER_VERSION = 1
+
+# Состояния лексера на конец строки. Блоки кода хранят символ ограждения:
+# "fence`" или "fence~"
+START = "start"  # перед первой строкой документа
+NORMAL = "normal"
+QUOTE = "quote"  # цитата, включая строки-продолжения без ">"
+FRONT_MATTER = "front_matter"
+
+FENCE_RE = re.compile(r" {0,3}(`{3,}|~{3,})")
+
+# Строчные элементы: проверяются по началу строки
+LINE_RULES = (
+    (re.compile(r"%\s"), "info"),
+    (re.compile(r"#\s"), "h1"),
+    (re.compile(r"##\s"), "h2"),
+    (re.compile(r"###\s"), "h3"),
+    (re.compile(r"####\s"), "h4"),
+    (re.compile(r"#####\s"), "h5"),
+)
+LIST_RE = re.compile(r"[\*\-\+]\s")
+
+# Встроенные элементы: (тег, обязательный символ, паттерн,
+# теги, внутри которых совпадение игнорируется)
+INLINE_RULES = (
+    ("bold_italic", "*", re.compile(r"\*\*\*(.+?)\*\*\*"), ()),
+    ("tag", "#", re.compile(r"#([a-zA-Zа-яА-ЯёЁ_-]+?\s)"), ()),
+    ("bold", "*", re.compile(r"\*\*(.+?)\*\*"), ("bold_italic",)),
+    ("italic", "*", re.compile(r"\*(.+?)\*"), ("bold", "bold_italic")),
+    ("code", "`", re.compile(r"`(.+?)`"), ()),
+    ("link", "[", re.compile(r"\[(.+?)\]\((.+?)\)"), ()),
+)
+
+
+class SpanIndex:
+    """Индекс интервалов [start, end), добавляемых в порядке возрастания начала.
+
+    Хранит отсортированные начала и префиксный максимум концов, поэтому
+    проверка «точка внутри какого-либо интервала» стоит O(log n)."""
+
+    def __init__(self):
+        self._starts = []
+        self._max_ends = []
+
+    def add(self, start, end):
+        if self._max_ends and self._max_ends[-1] > end:
+            end = self._max_ends[-1]
+        self._starts.append(start)
+        self._max_ends.append(end)
+
+    def covers(self, point):
+        i = bisect.bisect_right(self._starts, point)
+        return i > 0 and self._max_ends[i - 1] > point
+
+
+def scan_state(line, state):
+    """Состояние на конец строки по состоянию на её начало (без разбора элементов)"""
+    if state == FRONT_MATTER:
+        return NORMAL if line.rstrip() in ("---", "...") else FRONT_MATTER
+
+    fence = FENCE_RE.match(line)
+    if state.startswith("fence"):
+        if fence and fence.group(1)[0] == state[-1]:
+            return NORMAL
+        return state
+
+    if state == START and line.rstrip() == "---":
+        return FRONT_MATTER
+    if fence:
+        return "fence" + fence.group(1)[0]
+    if line.startswith(">") or (state == QUOTE and line.strip()):
+        return QUOTE
+    return NORMAL
+
+
+def tokenize_line(line, state=START):
+    """Возвращает список (тег, начальная колонка, конечная колонка) для одной строки
+    и состояние лексера на её конец"""
+    new_state = scan_state(line, state)
+
+    # Многострочные блоки: строка целиком, без встроенных элементов
+    if FRONT_MATTER in (state, new_state):
+        return [("front_matter", 0, len(line))], new_state
+    if state.startswith("fence") or new_state.startswith("fence"):
+        return [("code_block", 0, len(line))], new_state
+
+    spans = []
+    if new_state == QUOTE:
+        spans.append(("blockquote", 0, len(line)))
+    # Индексы строятся по мере появления спанов тех тегов, что кому-то исключают
+    indexes = {tag: SpanIndex() for _, _, _, excl in INLINE_RULES for tag in excl}
+
+    for pattern, tag in LINE_RULES:
+        if pattern.match(line):
+            spans.append((tag, 0, len(line)))
+            break
+
+    if LIST_RE.match(line):
+        spans.append(("list", 0, len(line)))
+
+    # Перевод строки нужен паттерну хэштега: "\s" в конце может быть концом строки
+    scan_line = line + "\n"
+    for tag, trigger, pattern, exclude_tags in INLINE_RULES:
+        # Без обязательного символа паттерн заведомо не совпадёт
+        if trigger not in line:
+            continue
+        excluded = [indexes[t] for t in exclude_tags]
+        index = indexes.get(tag)
+        for match in pattern.finditer(scan_line):
+            start = match.start()
+            if any(ex.covers(start) for ex in excluded):
+                continue
+            end = min(match.end(), len(line))
+            spans.append((tag, start, end))
+            if index is not None:
+                index.add(start, end)
+
+    return spans, new_state
+
+
+def tokenize_lines(text, first_line=1, state=START):
+    """Построчный разбор: отдаёт (номер строки, спаны строки в колонках,
+    состояние на конец строки)"""
+    for line_number, line in enumerate(text.split("\n"), first_line):
+        spans, state = tokenize_line(line, state)
+        yield line_number, spans, state
+
+
+def tokenize(text, first_line=1, state=START):
+    """Разбирает текст за один проход и возвращает список (тег, начало, конец)
+    с индексами в формате Text ("строка.символ")"""
+    spans = []
+    for line_number, line_spans, state in tokenize_lines(text, first_line, state):
+        for tag, start, end in line_spans:
+            spans.append((tag, f"{line_number}.{start}", f"{line_number}.{end}"))
+    return spans
@@ -4,13 +4,25 @@ from tkinter import ttk
 
 from dialog_manager import DialogManager
 from markdown_text import MarkdownText
+from search_utils import LineOffsets, compile_pattern, iter_match_indices
+
+# Метка верхней видимой строки на время замены всех совпадений
+VIEW_MARK = "replace_all_view"
+# Сколько строк вокруг совпадения берётся для повторной проверки перед заменой
+RECHECK_CONTEXT_LINES = 3
 
 
 class ReplaceDialog:
     def __init__(self, root, text_frame: MarkdownText):
         self.text_frame = text_frame
+        # Совпадения — пары меток Tk (начало, конец): их позиции сдвигаются
+        # вместе с текстом, поэтому после замены пересканировать не нужно
         self.search_matches = []
         self.search_index = -1
+        self.pattern = None
+        self.use_regex = False
+        self._mark_prefix = f"replace{id(self)}_"
+        self._mark_count = 0
 
         replace_win = tk.Toplevel(root)
         replace_win.title("Замена")
@@ -88,32 +100,7 @@ class ReplaceDialog:
         def replace_current():
             if not self.search_matches:
                 return
-
-            replace_text = replace_entry.get()
-            start, end = self.search_matches[self.search_index]
-
-            if regex_var.get():
-                # Get the actual matched text so we can expand backreferences
-                matched = self.text_frame.get(start, end)
-                try:
-                    flags = 0 if case_sensitive_var.get() else re.IGNORECASE
-                    # re.sub with count=1 expands \1, \2, \n, \g<name> etc. correctly
-                    expanded = re.sub(
-                        search_entry.get(), replace_text, matched, count=1, flags=flags
-                    )
-                except re.error as e:
-                    DialogManager.show_dialog("Ошибка RegEx", str(e))
-                    return
-                self.text_frame.delete(start, end)
-                self.text_frame.insert(start, expanded)
-            else:
-                # Ordinary (non-regex) replacement
-                self.text_frame.delete(start, end)
-                self.text_frame.insert(start, replace_text)
-
-            # After a successful replacement we must rebuild the match list
-            # (positions have shifted)
-            start_search()
+            self.replace_match(max(self.search_index, 0), replace_entry.get())
 
         def replace_all():
             term = search_entry.get()
@@ -121,25 +108,15 @@ class ReplaceDialog:
             if not term:
                 return
 
-            content = self.text_frame.get("1.0", tk.END)
-
             try:
-                if regex_var.get():
-                    flags = 0 if case_sensitive_var.get() else re.IGNORECASE
-                    new_content = re.sub(term, replace_text, content, flags=flags)
-                else:
-                    if case_sensitive_var.get():
-                        new_content = content.replace(term, replace_text)
-                    else:
-                        pattern = re.compile(re.escape(term), re.IGNORECASE)
-                        new_content = pattern.sub(replace_text, content)
+                pattern = compile_pattern(
+                    term, regex_var.get(), case_sensitive_var.get()
+                )
+                self.replace_all_matches(pattern, replace_text, regex_var.get())
             except re.error as e:
                 DialogManager.show_dialog("Ошибка RegEx", str(e))
                 return
 
-            self.text_frame.delete("1.0", tk.END)
-            self.text_frame.insert("1.0", new_content)
-
             # Rebuild highlights after the bulk replace
             self.find_all_matches(
                 self.text_frame,
@@ -174,14 +151,121 @@ class ReplaceDialog:
         )
 
         replace_win.bind("<Escape>", lambda e: self.close(replace_win))
+        replace_win.protocol("WM_DELETE_WINDOW", lambda: self.close(replace_win))
         search_entry.bind("<Return>", lambda e: start_search())
 
     # --- Логика поиска ---
     def close(self, win):
+        self._clear_matches()
         self.text_frame.tag_remove("search_highlight", "1.0", tk.END)
         self.text_frame.tag_remove("search_highlight_all", "1.0", tk.END)
         win.destroy()
 
+    def _set_matches(self, indices):
+        """Запоминает совпадения (пары индексов) метками Tk.
+
+        Начало имеет правую гравитацию, конец — левую: текст, вставленный
+        вплотную снаружи совпадения, в него не попадает.
+        """
+        marks = []
+        for start, end in indices:
+            name = f"{self._mark_prefix}{self._mark_count}"
+            self._mark_count += 1
+            self.search_matches.append((name + "s", name + "e"))
+            marks.append((name + "s", start, "right"))
+            marks.append((name + "e", end, "left"))
+        self.text_frame.set_marks(marks)
+
+    def _clear_matches(self):
+        names = [name for pair in self.search_matches for name in pair]
+        for i in range(0, len(names), 10000):
+            self.text_frame.mark_unset(*names[i : i + 10000])
+        self.search_matches.clear()
+
+    def _drop_match(self, i):
+        start, end = self.search_matches.pop(i)
+        self.text_frame.tag_remove("search_highlight_all", start, end)
+        self.text_frame.tag_remove("search_highlight", start, end)
+        self.text_frame.mark_unset(start, end)
+
+    def _recheck_match(self, start, end, replace_text):
+        """Проверяет совпадение на месте (текст мог измениться) и возвращает
+        текст замены или None, если шаблон здесь больше не совпадает"""
+        widget = self.text_frame
+        context_start = widget.index(f"{start} -{RECHECK_CONTEXT_LINES} lines linestart")
+        context_end = f"{end} +{RECHECK_CONTEXT_LINES} lines lineend"
+        context = widget.get(context_start, context_end)
+        pos = len(widget.get(context_start, start))
+        length = len(widget.get(start, end))
+
+        match = self.pattern.match(context, pos)
+        if not match or match.end() != pos + length:
+            return None
+        # expand раскрывает \1, \g<name>, \n и т. п. с учётом контекста совпадения
+        return match.expand(replace_text) if self.use_regex else replace_text
+
+    def replace_match(self, i, replace_text):
+        """Заменяет i-е совпадение и переходит к следующему без повторного поиска"""
+        widget = self.text_frame
+        start_mark, end_mark = self.search_matches[i]
+        start = widget.index(start_mark)
+        end = widget.index(end_mark)
+        try:
+            expanded = self._recheck_match(start, end, replace_text)
+        except re.error as e:
+            DialogManager.show_dialog("Ошибка RegEx", str(e))
+            return
+
+        self._drop_match(i)
+        if expanded is not None:
+            widget.delete(start, end)
+            widget.insert(start, expanded)
+
+        # Следующее совпадение встало на место i
+        self.search_index = i - 1
+        self.goto_next_match()
+
+    def replace_all_matches(self, pattern, replace_text, use_regex):
+        """Заменяет все совпадения точечными правками с конца текста.
+
+        Теги, подсветка незатронутых строк, курсор и прокрутка сохраняются,
+        а вся замена — один шаг undo. Бросает re.error при ошибке в шаблоне
+        замены (до каких-либо правок).
+        """
+        widget = self.text_frame
+        content = widget.get("1.0", "end-1c")
+        offsets = LineOffsets(content)
+
+        edits = []
+        for match in pattern.finditer(content):
+            new_text = match.expand(replace_text) if use_regex else replace_text
+            if new_text != match.group():
+                edits.append((match.start(), match.end(), new_text))
+        if not edits:
+            return 0
+
+        # Прокрутка запоминается меткой у верхней видимой строки
+        widget.mark_set(VIEW_MARK, "@0,0")
+        widget.mark_gravity(VIEW_MARK, "left")
+
+        autoseparators = widget.cget("autoseparators")
+        widget.configure(autoseparators=False)
+        widget.edit_separator()
+        # Подсветка и оглавление учитывают одну общую правку, а не каждую
+        widget.begin_edits()
+        try:
+            # С конца, чтобы индексы ещё не обработанных совпадений не сдвигались
+            for start, end, new_text in reversed(edits):
+                widget.replace(offsets.index(start), offsets.index(end), new_text)
+        finally:
+            widget.end_edits()
+            widget.edit_separator()
+            widget.configure(autoseparators=autoseparators)
+
+        widget.yview(VIEW_MARK)
+        widget.mark_unset(VIEW_MARK)
+        return len(edits)
+
     def goto_next_match(self):
         if not self.search_matches:
             return
@@ -202,11 +286,6 @@ class ReplaceDialog:
         self.text_frame.tag_remove("search_highlight", "1.0", tk.END)
         self.text_frame.tag_add("search_highlight", start, end)
 
-    def index_to_text_pos(self, text, index):
-        line = text.count("\n", 0, index) + 1
-        col = index - text.rfind("\n", 0, index) - 1
-        return f"{line}.{col}"
-
     def find_all_matches(
         self,
         widget,
@@ -217,45 +296,37 @@ class ReplaceDialog:
         from_start=False,
     ):
         widget.tag_remove("current_line", "1.0", tk.END)
-        self.search_matches.clear()
+        self._clear_matches()
         self.search_index = -1
 
         text_content = widget.get("1.0", tk.END)
 
-        if use_regex:
-            try:
-                flags = 0 if case_sensitive else re.IGNORECASE
-                for match in re.finditer(term, text_content, flags=flags):
-                    start = self.index_to_text_pos(text_content, match.start())
-                    end = self.index_to_text_pos(text_content, match.end())
-                    if select_all:
-                        widget.tag_add("search_highlight_all", start, end)
-                    self.search_matches.append([start, end])
-            except re.error as e:
-                DialogManager.show_dialog("Ошибка RegEx", str(e))
-                return
-        else:
-            start_pos = "1.0"
-            while True:
-                start_pos = widget.search(
-                    term, start_pos, nocase=not case_sensitive, stopindex=tk.END
-                )
-                if not start_pos:
-                    break
-                end_pos = f"{start_pos}+{len(term)}c"
-                if select_all:
-                    widget.tag_add("search_highlight_all", start_pos, end_pos)
-                self.search_matches.append([start_pos, end_pos])
-                start_pos = end_pos
+        try:
+            pattern = compile_pattern(term, use_regex, case_sensitive)
+        except re.error as e:
+            DialogManager.show_dialog("Ошибка RegEx", str(e))
+            return
+
+        self.pattern = pattern
+        self.use_regex = use_regex
+        indices = list(iter_match_indices(text_content, pattern))
+
+        # Подсветка всех совпадений уходит в Tcl пачкой, а не вызовом на каждое
+        if select_all:
+            with widget.tag_batch() as batch:
+                for start, end in indices:
+                    batch.add("search_highlight_all", start, end)
 
         # Начинаем с текущего места курсора (если не «С начала»)
-        if self.search_matches and not from_start:
-            current_pos = widget.index("insert")
-            for i, (start, end) in enumerate(self.search_matches):
-                if widget.compare(start, ">=", current_pos):
+        if indices and not from_start:
+            current_pos = tuple(map(int, widget.index("insert").split(".")))
+            for i, (start, end) in enumerate(indices):
+                if tuple(map(int, start.split("."))) >= current_pos:
                     self.search_index = i - 1  # следующий goto_next_match попадёт на i
                     break
             # если все совпадения до курсора → остаётся -1 → wrap на первое
 
+        self._set_matches(indices)
+
         widget.tag_config("search_highlight_all", background="#7CFC00")
         widget.tag_config("search_highlight", background="green")
@@ -1,16 +1,44 @@
+import bisect
 import re
 import tkinter as tk
 from tkinter import ttk
 
 from dialog_manager import DialogManager
+from line_ranges import LineRangeSet
 from markdown_text import MarkdownText
+from search_results import SearchResultsPanel
+from search_utils import BackgroundSearch, compile_pattern, iter_match_indices
+from toc_list import parse_outline
+
+# Задержка поиска при наборе, мс
+LIVE_SEARCH_DELAY_MS = 300
+# Сколько совпадений подсвечивается сразу; остальные — по мере прокрутки
+EAGER_TAG_LIMIT = 2000
+# Запас строк вокруг видимой области при подсветке совпадений
+VISIBLE_MARGIN = 100
+# Сколько символов строки показывать до и после совпадения в списке результатов
+RESULT_CONTEXT_BEFORE = 30
+RESULT_CONTEXT_AFTER = 70
 
 
 class SearchDialog:
     def __init__(self, root, text_frame: MarkdownText):
         self.text_frame = text_frame
         self.search_matches = []
+        # Номера строк начал совпадений — для поиска видимых двоичным поиском
+        self._match_lines = []
+        # Диапазоны индексов совпадений, уже подсвеченных search_highlight_all
+        self._tagged = LineRangeSet()
         self.search_index = -1
+        self.background_search = None
+        self.select_all = False
+        self._live_job = None
+        # Переход к первому совпадению ждёт, пока оно не придёт из поиска
+        self._goto_pending = False
+        self._goto_from = None
+        # Оглавление для заголовков в списке результатов; строится по запросу
+        self._heading_lines = None
+        self._heading_titles = None
 
         search_win = tk.Toplevel(root)
         search_win.title("Поиск")
@@ -29,10 +57,12 @@ class SearchDialog:
             r"(?<!\n\n)\n\*{3,}\n(?!\n\n)",
         ]
 
-        tk.Label(search_win, text="Найти:").pack(side=tk.LEFT, padx=5, pady=5)
+        find_label = tk.Label(search_win, text="Найти:")
+        find_label.pack(side=tk.LEFT, padx=5, pady=5)
 
+        search_var = tk.StringVar()
         search_entry = ttk.Combobox(
-            search_win, values=options, width=30, state="normal"
+            search_win, textvariable=search_var, values=options, width=30, state="normal"
         )
         search_entry.focus_set()
         search_entry.pack(side=tk.LEFT, padx=5, pady=5)
@@ -62,12 +92,20 @@ class SearchDialog:
 
         self.search_started = False
 
-        def start_search():
+        def start_search(live=False):
+            if self._live_job:
+                self.text_frame.after_cancel(self._live_job)
+                self._live_job = None
             self.text_frame.tag_remove("search_highlight", "1.0", tk.END)
             self.text_frame.tag_remove("search_highlight_all", "1.0", tk.END)
             self.search_started = True
             term = search_entry.get()
             if not term or not self.text_frame:
+                self.cancel_search()
+                self.search_matches.clear()
+                self._match_lines.clear()
+                self.results_panel.reset()
+                self.status_label.config(text="")
                 return
             self.find_all_matches(
                 self.text_frame,
@@ -76,8 +114,18 @@ class SearchDialog:
                 select_all_var.get(),
                 match_case_var.get(),
                 from_start_var.get(),
+                live,
+            )
+
+        def schedule_live_search(*args):
+            # Поиск при наборе запускается после паузы в вводе
+            if self._live_job:
+                self.text_frame.after_cancel(self._live_job)
+            self._live_job = self.text_frame.after(
+                LIVE_SEARCH_DELAY_MS, lambda: start_search(live=True)
             )
-            self.goto_next_match()
+
+        search_var.trace_add("write", schedule_live_search)
 
         def next_match():
             if self.search_started:
@@ -97,6 +145,9 @@ class SearchDialog:
         tk.Button(
             search_win, text="⬇️", command=next_match, font=("Noto Color Emoji", 10)
         ).pack(side=tk.LEFT, padx=2)
+        tk.Button(
+            search_win, text="⏹", command=self.cancel_search, font=("Noto Color Emoji", 10)
+        ).pack(side=tk.LEFT, padx=2)
         tk.Button(
             search_win,
             text="❌",
@@ -104,10 +155,54 @@ class SearchDialog:
             font=("Noto Color Emoji", 10),
         ).pack(side=tk.LEFT, padx=2)
 
+        # Список всех совпадений; показывается кнопкой, по умолчанию скрыт
+        self.results_panel = SearchResultsPanel(
+            search_win, self.result_row, self.goto_match
+        )
+
+        def toggle_results():
+            if self.results_panel.visible:
+                self.results_panel.hide()
+            else:
+                self.results_panel.show(
+                    side=tk.BOTTOM, fill=tk.BOTH, expand=True, before=find_label
+                )
+
+        tk.Button(
+            search_win, text="📋", command=toggle_results, font=("Noto Color Emoji", 10)
+        ).pack(side=tk.LEFT, padx=2)
+
+        self.status_label = tk.Label(search_win, width=16, anchor="w")
+        self.status_label.pack(side=tk.LEFT, padx=5)
+
         search_entry.bind("<Return>", lambda e: start_search())
         search_win.bind("<Escape>", lambda e: self.close_search(search_win))
+        search_win.protocol("WM_DELETE_WINDOW", lambda: self.close_search(search_win))
+
+        # После правок текста найденные позиции устаревают
+        self.text_frame.add_change_listener(self.on_text_changed)
+        # При прокрутке подсвечиваются совпадения, ставшие видимыми
+        self.text_frame.add_view_listener(self.tag_visible_matches)
+
+    def on_text_changed(self, edits):
+        self.search_started = False
+        self._heading_lines = None
+        # Смещения в уже переданном тексте устарели
+        self.cancel_search()
+
+    def cancel_search(self):
+        if self.background_search and self.background_search.running:
+            self.background_search.cancel()
+            self.status_label.config(text=f"Остановлено: {len(self.search_matches)}")
+        self.background_search = None
 
     def close_search(self, search_win):
+        self.cancel_search()
+        if self._live_job:
+            self.text_frame.after_cancel(self._live_job)
+            self._live_job = None
+        self.text_frame.remove_change_listener(self.on_text_changed)
+        self.text_frame.remove_view_listener(self.tag_visible_matches)
         self.text_frame.tag_remove("search_highlight", "1.0", tk.END)
         self.text_frame.tag_remove("search_highlight_all", "1.0", tk.END)
         search_win.destroy()
@@ -115,19 +210,7 @@ class SearchDialog:
     def goto_prev_match(self):
         if not self.search_matches:
             return
-        self.search_index = (self.search_index - 1) % len(self.search_matches)
-        start_pos = self.search_matches[self.search_index][0]
-        end_pos = self.search_matches[self.search_index][1]
-        self.text_frame.see(start_pos)
-        self.text_frame.mark_set("insert", start_pos)
-        self.text_frame.tag_remove("search_highlight", "1.0", tk.END)
-        self.text_frame.tag_add("search_highlight", start_pos, end_pos)
-
-    def index_to_text_pos(self, text, index):
-        """Преобразует позицию символа (int) в формат 'строка.символ' для Text"""
-        line = text.count("\n", 0, index) + 1
-        col = index - text.rfind("\n", 0, index) - 1
-        return f"{line}.{col}"
+        self.goto_match((self.search_index - 1) % len(self.search_matches))
 
     def find_all_matches(
         self,
@@ -137,64 +220,141 @@ class SearchDialog:
         select_all=False,
         match_case=False,
         from_start=False,
+        live=False,
     ):
+        self.cancel_search()
         widget.tag_remove("current_line", "1.0", tk.END)
         self.search_matches.clear()
+        self._match_lines.clear()
+        self._tagged.clear()
+        self._heading_lines = None
+        self.results_panel.reset()
         self.search_index = -1
 
         text_content = widget.get("1.0", tk.END)
 
-        if use_regex:
-            try:
-                flags = 0 if match_case else re.IGNORECASE
-                for match in re.finditer(term, text_content, flags=flags):
-                    start_index = self.index_to_text_pos(text_content, match.start())
-                    end_index = self.index_to_text_pos(text_content, match.end())
-                    if select_all:
-                        widget.tag_add("search_highlight_all", start_index, end_index)
-                    else:
-                        widget.tag_remove("search_highlight_all", "1.0", tk.END)
-                    self.search_matches.append([start_index, end_index])
-            except re.error as e:
+        if not select_all:
+            widget.tag_remove("search_highlight_all", "1.0", tk.END)
+
+        try:
+            pattern = compile_pattern(term, use_regex, match_case)
+        except re.error as e:
+            # При наборе выражение часто временно некорректно — без всплывающего окна
+            if live:
+                self.status_label.config(text="Ошибка RegEx")
+            else:
                 DialogManager.show_dialog("Ошибка RegEx", str(e))
-                return
+            return
+
+        self.select_all = select_all
+        self._goto_pending = True
+        self._goto_from = (
+            None if from_start else tuple(map(int, widget.index("insert").split(".")))
+        )
+
+        if use_regex:
+            # Регулярное выражение может перебирать бесконечно долго —
+            # ищем в отдельном процессе, совпадения приходят порциями
+            self.status_label.config(text="Поиск…")
+            self.background_search = BackgroundSearch(
+                widget, text_content, pattern, self.add_matches, self.search_done
+            )
         else:
-            start_pos = "1.0"
-            while True:
-                start_pos = widget.search(
-                    term, start_pos, nocase=not match_case, stopindex=tk.END
-                )
-                if not start_pos:
-                    break
-                end_pos = f"{start_pos}+{len(term)}c"
-                if select_all:
-                    widget.tag_add("search_highlight_all", start_pos, end_pos)
-                else:
-                    widget.tag_remove("search_highlight_all", "1.0", tk.END)
-                self.search_matches.append([start_pos, end_pos])
-                start_pos = end_pos
-
-        # Настройка начального индекса: по умолчанию — с текущей позиции курсора
-        if self.search_matches and not from_start:
-            current_pos = widget.index("insert")
-            for i, (start, end) in enumerate(self.search_matches):
-                if widget.compare(start, ">=", current_pos):
-                    self.search_index = i - 1  # следующий goto_next_match попадёт на i
-                    break
-            # если все совпадения до курсора — остаётся -1 → wrap на первое
+            self.add_matches(list(iter_match_indices(text_content, pattern)))
+            self.search_done(None)
 
         widget.tag_config(
             "search_highlight_all", background="#7CFC00", foreground="black"
         )
         widget.tag_config("search_highlight", background="green", foreground="black")
 
+    def add_matches(self, matches):
+        """Принимает очередную порцию совпадений (пары индексов Text)"""
+        first = len(self.search_matches)
+        self.search_matches.extend([start, end] for start, end in matches)
+        self._match_lines.extend(int(start.split(".", 1)[0]) for start, _ in matches)
+        self.results_panel.set_count(len(self.search_matches))
+
+        if self.select_all:
+            if len(self.search_matches) <= EAGER_TAG_LIMIT:
+                self._tag_matches(first, len(self.search_matches) - 1)
+            else:
+                self.tag_visible_matches()
+
+        if self.background_search:
+            self.status_label.config(text=f"Поиск… {len(self.search_matches)}")
+
+        # Первое совпадение после курсора (или просто первое, если «С начала»)
+        if self._goto_pending:
+            for i, (start, end) in enumerate(matches, first):
+                if (
+                    self._goto_from is None
+                    or tuple(map(int, start.split("."))) >= self._goto_from
+                ):
+                    self._goto_pending = False
+                    self.search_index = i - 1  # goto_next_match попадёт на i
+                    self.goto_next_match()
+                    break
+
+    def _tag_matches(self, first, last):
+        """Подсвечивает совпадения с индексами [first, last]"""
+        # Подсветка всех совпадений уходит в Tcl пачкой, а не вызовом на каждое
+        with self.text_frame.tag_batch() as batch:
+            for start, end in self.search_matches[first : last + 1]:
+                batch.add("search_highlight_all", start, end)
+        self._tagged.add(first, last)
+
+    def tag_visible_matches(self):
+        """Подсвечивает ещё не подсвеченные совпадения в видимой области"""
+        if not self.select_all or not self.search_matches:
+            return
+        top, bottom = self.text_frame.visible_lines()
+        first = bisect.bisect_left(self._match_lines, top - VISIBLE_MARGIN)
+        last = bisect.bisect_right(self._match_lines, bottom + VISIBLE_MARGIN) - 1
+        for gap_first, gap_last in self._tagged.missing(first, last):
+            self._tag_matches(gap_first, gap_last)
+
+    def search_done(self, error):
+        self.background_search = None
+        self.status_label.config(text=f"Найдено: {len(self.search_matches)}")
+        if error:
+            DialogManager.show_dialog("Ошибка поиска", error, timeout=3000)
+        # Все совпадения до курсора — переход по кругу на первое
+        if self._goto_pending and self.search_matches:
+            self._goto_pending = False
+            self.search_index = -1
+            self.goto_next_match()
+
     def goto_next_match(self):
         if not self.search_matches:
             return
-        self.search_index = (self.search_index + 1) % len(self.search_matches)
-        start_pos = self.search_matches[self.search_index][0]
-        end_pos = self.search_matches[self.search_index][1]
+        self.goto_match((self.search_index + 1) % len(self.search_matches))
+
+    def goto_match(self, index):
+        self.search_index = index
+        start_pos, end_pos = self.search_matches[index]
         self.text_frame.see(start_pos)
         self.text_frame.mark_set("insert", start_pos)
         self.text_frame.tag_remove("search_highlight", "1.0", tk.END)
         self.text_frame.tag_add("search_highlight", start_pos, end_pos)
+        self.results_panel.select(index)
+
+    def result_row(self, index):
+        """Строка списка результатов: номер строки, контекст и заголовок раздела"""
+        line = self._match_lines[index]
+        col = int(self.search_matches[index][0].split(".")[1])
+        text = self.text_frame.get(f"{line}.0", f"{line}.end")
+        start = max(0, col - RESULT_CONTEXT_BEFORE)
+        context = ("…" if start else "") + text[start : col + RESULT_CONTEXT_AFTER]
+        heading = self.heading_for(line)
+        row = f"{line}: {context.strip()}"
+        return f"{row}   [{heading}]" if heading else row
+
+    def heading_for(self, line):
+        """Название ближайшего заголовка не ниже строки line"""
+        if self._heading_lines is None:
+            outline = parse_outline(self.text_frame.get("1.0", "end-1c").split("\n"))
+            self._heading_lines = [n for n, _, _ in outline]
+            self._heading_titles = [title.strip() for _, _, title in outline]
+        i = bisect.bisect_right(self._heading_lines, line) - 1
+        return self._heading_titles[i] if i >= 0 else ""
@@ -0,0 +1,143 @@
+import tkinter as tk
+import tkinter.font as tkfont
+
+
+class SearchResultsPanel(tk.Frame):
+    """Виртуальный список результатов поиска.
+
+    На холсте всегда столько текстовых элементов, сколько строк видно;
+    при прокрутке они только переподписываются. Текст строки запрашивается
+    через get_row(i) лишь для видимых строк, поэтому число результатов
+    на скорость отрисовки не влияет. Пока панель скрыта (show/hide), она
+    только запоминает число результатов и не перерисовывается.
+    """
+
+    def __init__(self, parent, get_row, on_activate, rows=15, width=700, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.get_row = get_row
+        self.on_activate = on_activate
+        self.rows = rows
+        self.count = 0
+        self.first = 0
+        self.selected = None
+        self.visible = False
+
+        font = tkfont.nametofont("TkDefaultFont")
+        self.row_height = font.metrics("linespace") + 2
+
+        self.canvas = tk.Canvas(
+            self,
+            width=width,
+            height=rows * self.row_height,
+            highlightthickness=0,
+            background="white",
+        )
+        self.scroll = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scroll.pack(side=tk.LEFT, fill=tk.Y)
+
+        self._selection_box = self.canvas.create_rectangle(
+            0, 0, 0, 0, fill="#cce8ff", outline="", state="hidden"
+        )
+        self._items = [
+            self.canvas.create_text(
+                4, i * self.row_height + 1, anchor="nw", text="", font=font
+            )
+            for i in range(rows)
+        ]
+        # Индекс результата, показанный каждым элементом (None — пусто)
+        self._shown = [None] * rows
+
+        self.canvas.bind("<Button-1>", self.on_click)
+        self.canvas.bind("<MouseWheel>", self.on_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self.yview("scroll", -3, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.yview("scroll", 3, "units"))
+
+    def set_count(self, count):
+        """Число результатов изменилось (новый поиск или очередная порция)"""
+        self.count = count
+        if self.selected is not None and self.selected >= count:
+            self.selected = None
+        self.first = max(0, min(self.first, count - self.rows))
+        self.refresh()
+
+    def show(self, **pack_options):
+        self.visible = True
+        self.pack(**pack_options)
+        self.refresh(force=True)
+
+    def hide(self):
+        self.visible = False
+        self.pack_forget()
+
+    def reset(self):
+        self.first = 0
+        self.selected = None
+        self.count = 0
+        self.refresh(force=True)
+
+    def yview(self, *args):
+        """Команда полосы прокрутки: moveto доля | scroll n units|pages"""
+        if args[0] == "moveto":
+            first = int(float(args[1]) * self.count)
+        elif args[0] == "scroll":
+            step = self.rows if args[2] == "pages" else 1
+            first = self.first + int(args[1]) * step
+        else:
+            return
+        self.first = max(0, min(first, self.count - self.rows))
+        self.refresh()
+
+    def see(self, index):
+        if index < self.first:
+            self.first = index
+        elif index >= self.first + self.rows:
+            self.first = index - self.rows + 1
+        self.refresh()
+
+    def select(self, index):
+        self.selected = index
+        if index is not None:
+            self.see(index)
+        self._draw_selection()
+
+    def refresh(self, force=False):
+        if not self.visible:
+            # Скрытую панель перерисует show()
+            return
+        for row, item in enumerate(self._items):
+            index = self.first + row
+            if index >= self.count:
+                index = None
+            if index == self._shown[row] and not force:
+                continue
+            self._shown[row] = index
+            self.canvas.itemconfigure(
+                item, text="" if index is None else self.get_row(index)
+            )
+        self._draw_selection()
+
+        if self.count:
+            self.scroll.set(self.first / self.count, (self.first + self.rows) / self.count)
+        else:
+            self.scroll.set(0, 1)
+
+    def _draw_selection(self):
+        row = None if self.selected is None else self.selected - self.first
+        if row is None or not 0 <= row < self.rows:
+            self.canvas.itemconfigure(self._selection_box, state="hidden")
+            return
+        y = row * self.row_height
+        self.canvas.coords(
+            self._selection_box, 0, y, self.canvas.winfo_width(), y + self.row_height
+        )
+        self.canvas.itemconfigure(self._selection_box, state="normal")
+
+    def on_click(self, event):
+        index = self.first + event.y // self.row_height
+        if index < self.count:
+            self.select(index)
+            self.on_activate(index)
+
+    def on_wheel(self, event):
+        self.yview("scroll", -3 if event.delta > 0 else 3, "units")
@@ -0,0 +1,134 @@
+import bisect
+import multiprocessing
+import queue
+import re
+import time
+from itertools import accumulate
+
+# Фоновый поиск: предельное время, период опроса и размер порции совпадений
+SEARCH_TIMEOUT = 10.0
+POLL_MS = 50
+BATCH_SIZE = 1000
+BATCH_INTERVAL = 0.1
+
+
+class LineOffsets:
+    """Таблица смещений начал строк текста.
+
+    Строится один раз за поиск; смещение символа переводится в индекс Text
+    двоичным поиском, а не подсчётом переводов строк от начала текста.
+    """
+
+    def __init__(self, text):
+        self.starts = [0, *accumulate(len(line) + 1 for line in text.split("\n"))]
+        # Совпадения идут по возрастанию — поиск начинается с прошлой строки
+        self._last = 0
+
+    def line_of(self, offset):
+        """Номер строки (с 1) для смещения offset"""
+        lo = self._last if offset >= self.starts[self._last] else 0
+        i = bisect.bisect_right(self.starts, offset, lo) - 1
+        self._last = i
+        return i + 1
+
+    def index(self, offset):
+        """Преобразует смещение символа (int) в формат 'строка.символ' для Text"""
+        line = self.line_of(offset)
+        return f"{line}.{offset - self.starts[line - 1]}"
+
+
+def compile_pattern(term, use_regex=False, match_case=False):
+    """Шаблон поиска; обычная строка ищется как есть. Бросает re.error"""
+    flags = 0 if match_case else re.IGNORECASE
+    return re.compile(term if use_regex else re.escape(term), flags)
+
+
+def iter_match_indices(text, pattern):
+    """Совпадения шаблона в тексте как пары индексов Text (начало, конец)"""
+    offsets = LineOffsets(text)
+    for match in pattern.finditer(text):
+        yield offsets.index(match.start()), offsets.index(match.end())
+
+
+def _search_worker(text, pattern, flags, results):
+    """Процесс поиска: отправляет смещения совпадений порциями"""
+    batch = []
+    sent_at = time.monotonic()
+    try:
+        for match in re.compile(pattern, flags).finditer(text):
+            batch.append((match.start(), match.end()))
+            now = time.monotonic()
+            if len(batch) >= BATCH_SIZE or now - sent_at > BATCH_INTERVAL:
+                results.put(("matches", batch))
+                batch = []
+                sent_at = now
+    except re.error as e:
+        results.put(("error", str(e)))
+        return
+    results.put(("matches", batch))
+    results.put(("done", None))
+
+
+class BackgroundSearch:
+    """Поиск по регулярному выражению в отдельном процессе.
+
+    Шаблон с катастрофическим перебором не может подвесить редактор: процесс
+    снимается по cancel() или по истечении timeout секунд. Совпадения
+    приходят порциями в on_matches (списки пар индексов Text), по окончании
+    вызывается on_done(error), где error — None или текст ошибки.
+    """
+
+    def __init__(
+        self, widget, text, pattern, on_matches, on_done, timeout=SEARCH_TIMEOUT
+    ):
+        self.widget = widget
+        self.on_matches = on_matches
+        self.on_done = on_done
+        self.offsets = LineOffsets(text)
+        self.timeout = timeout
+
+        context = multiprocessing.get_context("spawn")
+        self._results = context.Queue()
+        self._process = context.Process(
+            target=_search_worker,
+            args=(text, pattern.pattern, pattern.flags, self._results),
+            daemon=True,
+        )
+        self._process.start()
+        self._deadline = time.monotonic() + timeout
+        self._job = widget.after(POLL_MS, self._poll)
+
+    @property
+    def running(self):
+        return self._job is not None
+
+    def cancel(self):
+        """Прерывает поиск без вызова on_done"""
+        if self._job:
+            self.widget.after_cancel(self._job)
+            self._job = None
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process.join()
+
+    def _poll(self):
+        self._job = None
+        while True:
+            try:
+                kind, payload = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "matches":
+                if payload:
+                    index = self.offsets.index
+                    self.on_matches([(index(start), index(end)) for start, end in payload])
+                continue
+            self._process.join()
+            self.on_done(payload)
+            return
+
+        if time.monotonic() > self._deadline:
+            self.cancel()
+            self.on_done(f"Поиск прерван: дольше {self.timeout:g} с")
+            return
+        self._job = self.widget.after(POLL_MS, self._poll)
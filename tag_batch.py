@@ -0,0 +1,65 @@
+class TagBatch:
+    """Накапливает tag add/remove и отправляет их в Tcl пачками.
+
+    Команды "tag add" и "tag remove" принимают сразу много пар индексов,
+    поэтому диапазоны одного тега уходят одним вызовом вместо вызова на каждый.
+    Используется как контекстный менеджер: при выходе всё сбрасывается.
+    """
+
+    # Ограничение на число пар в одной команде, чтобы не раздувать строку Tcl
+    MAX_PAIRS = 10000
+
+    def __init__(self, text_widget, stats=None):
+        self.text_widget = text_widget
+        # Общие счётчики виджета: ranges, calls, saved
+        self.stats = stats
+        # (операция, тег) -> плоский список индексов; порядок вставки сохраняется
+        self._pending = {}
+        self.ranges = 0
+        self.calls = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    def add(self, tag, start, end):
+        self._queue("add", tag, start, end)
+
+    def remove(self, tag, start, end):
+        self._queue("remove", tag, start, end)
+
+    def _queue(self, op, tag, start, end):
+        # add и remove одного тега не переставимы: сначала отправляем накопленное
+        opposite = ("remove" if op == "add" else "add", tag)
+        if opposite in self._pending:
+            self._send(opposite, self._pending.pop(opposite))
+
+        indices = self._pending.setdefault((op, tag), [])
+        indices.append(start)
+        indices.append(end)
+        self.ranges += 1
+
+    def _send(self, key, indices):
+        op, tag = key
+        widget = self.text_widget
+        step = self.MAX_PAIRS * 2
+        for i in range(0, len(indices), step):
+            widget.tk.call(widget._w, "tag", op, tag, *indices[i : i + step])
+            self.calls += 1
+
+    def flush(self):
+        """Отправляет накопленные операции; возвращает число сэкономленных вызовов"""
+        for key, indices in self._pending.items():
+            self._send(key, indices)
+        self._pending.clear()
+
+        saved = self.ranges - self.calls
+        if self.stats is not None:
+            self.stats["ranges"] += self.ranges
+            self.stats["calls"] += self.calls
+            self.stats["saved"] += saved
+        self.ranges = 0
+        self.calls = 0
+        return saved
@@ -1,65 +1,403 @@
+import itertools
 import os
 import re
-import tkinter as tk
+import sys
+import tempfile
 
+from correction_rules import RulesError, RuleSet, merge_tables, read_table
+from dialog_manager import DialogManager
 from markdown_text import MarkdownText
 
 CONFIG_FILE = "replacements.json"
+# Правила приложения лежат рядом с программой
+APP_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), CONFIG_FILE)
 
-replacements = {
-    "simple": {
-        "»": '"',
-        "«": '"',
-        "“": '"',
-        "”": '"',
-        "–": "—",
-        " - ": " — ",
-        " -": " — ",
-        "- ": " — ",
-        ". .": "..",
-        "..": "...",
-        " .": ".",
-        " ,": ",",
-        " !": "!",
-        " ?": "?",
-        " …": "…",
-        "* ": "*",
-        "_ ": "_",
-        ' ".\n': '".\n',
-        '. "\n': '."\n',
-        ' "!\n': '"!\n',
-        '! "\n': '!"\n',
-        ' "?\n': '"?\n',
-        '? "\n': '?"\n',
-        " *": "*",
-        ", #": " #",
-        ".…": "…",
-    },
-    "regex": {
-        "\\.{2,}": "…",
-        "\\*{4,}": "***",
-        "…{2,}": "…",
-        " {2,}": " ",
-        "…(?!\\s)": "… ",
-        "^\\. ": "",
-        "(?<!\n)\n(?!\n|#|\\*)": "\n\n",
-    },
-}
+# Разделители строк str.splitlines, кроме \n; без них строки можно
+# обрабатывать регулярками
+LINE_BREAKS = "\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+
+# Строки ищутся от предшествующего \n: литеральное начало шаблона
+# re находит быстрым поиском, а не проверкой каждой позиции.
+# Строка из одних пробелов
+BLANK_LINE = re.compile(r"\n[^\S\n]+(?![^\n])")
+# Начало обычной строки (не #, % и не список), если оно отличается
+# от ровно одного пробела перед текстом
+LINE_START = re.compile(r"\n(?![#%]| [^\s*])[^\S\n]*+(?=[^*\n])")
+
+# Конец абзаца: пустые строки перед следующим текстом
+PARAGRAPH_END = re.compile(r"\n\n+(?=[^\n])")
+
+# Абзацы склеиваются в порции такого размера перед цепочкой правил
+STREAM_CHUNK_CHARS = 1 << 14
+# По сколько строк читается текст виджета
+WIDGET_BLOCK_LINES = 500
+# Исправленный текст вставляется в виджет порциями не меньше этой
+WIDGET_INSERT_CHARS = 1 << 16
+# Начало ещё не прочитанного исходного текста; результат вставляется перед ней
+SOURCE_MARK = "correct_source"
+
+# (правила приложения, правила книги) -> (их mtime, RuleSet)
+_rules_cache = {}
+
+
+def book_rules_path(file_path):
+    """Правила книги: <имя>.replacements.json рядом с файлом и его .bnf"""
+    base, _ = os.path.splitext(file_path)
+    return f"{base}.{CONFIG_FILE}"
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_rules(file_path=""):
+    """Скомпилированные правила для книги file_path.
+
+    Правила книги дополняют правила приложения из replacements.json.
+    Результат кэшируется и компилируется заново, только когда меняется
+    время изменения одного из файлов. Ошибки в файлах и отсутствие
+    replacements.json — RulesError.
+    """
+    paths = (APP_RULES_PATH, book_rules_path(file_path) if file_path else None)
+    mtimes = tuple(path and _mtime(path) for path in paths)
+    cached = _rules_cache.get(paths)
+    if cached and cached[0] == mtimes:
+        return cached[1]
+
+    app_path, book_path = paths
+    table = read_table(app_path)
+    if mtimes[1] is not None:
+        table = merge_tables(table, read_table(book_path, allow_remove=True))
+    rules = RuleSet.from_table(table)
+    _rules_cache[paths] = (mtimes, rules)
+    return rules
+
+
+def iter_paragraphs(pieces):
+    """Куски текста -> абзацы вместе с пустыми строками после них"""
+    carry = ""
+    for piece in pieces:
+        # Абзац мог закончиться на переводах строк в конце остатка
+        start = len(carry)
+        while start and carry[start - 1] == "\n":
+            start -= 1
+        carry += piece
+        end = 0
+        for match in PARAGRAPH_END.finditer(carry, start):
+            yield carry[end : match.end()]
+            end = match.end()
+        carry = carry[end:]
+    if carry:
+        yield carry
+
+
+def group_pieces(pieces, size):
+    """Склеивает мелкие куски (абзацы) в порции не меньше size символов,
+    чтобы цепочка правил не тратила время на вызовы для каждого абзаца"""
+    batch = []
+    length = 0
+    for piece in pieces:
+        batch.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield "".join(batch)
+            batch = []
+            length = 0
+    if batch:
+        yield "".join(batch)
+
+
+def lstrip_pieces(pieces):
+    """str.lstrip для текста, поданного кусками"""
+    pieces = iter(pieces)
+    for piece in pieces:
+        piece = piece.lstrip()
+        if piece:
+            yield piece
+            break
+    yield from pieces
+
+
+def rstrip_pieces(pieces):
+    """str.rstrip для текста, поданного кусками"""
+    pending = ""
+    for piece in pieces:
+        body = piece.rstrip()
+        if body:
+            yield pending + body
+            pending = piece[len(body) :]
+        else:
+            # Пробелы в конце держатся, пока не придёт текст
+            pending += piece
+
+
+def iter_file(path, size=STREAM_CHUNK_CHARS):
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter(lambda: f.read(size), "")
+
+
+def correct_file(path, file_path=None):
+    """Исправляет файл на диске потоково: в памяти держится лишь текущий
+    абзац. Результат пишется во временный файл рядом и заменяет исходный.
+    file_path — книга, чьи правила применять (по умолчанию сам файл)"""
+    corrector = TextCorrector(None)
+    pieces = corrector.iter_corrected(iter_file(path), file_path or path)
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.writelines(pieces)
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
 
 class TextCorrector:
     def __init__(self, text_frame: MarkdownText):
         self.text_frame = text_frame
+        # hash() абзацев текста после последнего исправления и то, для
+        # какой книги и каких правил (RuleSet из кэша) оно сделано
+        self.paragraph_hashes = set()
+        self.corrected_for = None
 
     def correct_text(self, file_path):
-        text = self.text_frame.get("1.0", tk.END).strip()
-        text = self.normalize_text(text, file_path)
-        self.text_frame.delete("1.0", tk.END)
-        self.text_frame.insert(tk.END, text)
-        self.text_frame.highlight_markdown()
+        """Исправляет текст виджета. Если это уже делалось для той же книги
+        с теми же правилами, правила применяются только к абзацам, которых
+        не было в результате прошлого исправления. Всё изменение — один
+        шаг отмены"""
+        try:
+            rules = load_rules(file_path)
+        except RulesError as e:
+            DialogManager.show_dialog("Ошибка в правилах", str(e), timeout=5000)
+            return
 
-    def normalize_text(self, content: str, file_path: str) -> str:
-        # Заголовок
+        widget = self.text_frame
+        full = self.corrected_for != (file_path, rules) or not self.paragraph_hashes
+        autoseparators = widget.cget("autoseparators")
+        widget.configure(autoseparators=False)
+        widget.edit_separator()
+        widget.begin_edits()
+        try:
+            if full:
+                hashes = self.correct_all(rules, file_path)
+            else:
+                self.correct_changed(rules, file_path)
+            self.strip_edges()
+        finally:
+            widget.end_edits()
+            widget.edit_separator()
+            widget.configure(autoseparators=autoseparators)
+
+        if full:
+            self.paragraph_hashes = hashes
+            # Изменённые строки подсвечиваются сами; после полной замены
+            # текста подсвечиваем документ заново
+            widget.highlight_markdown()
+        else:
+            self.remember_paragraphs()
+        self.corrected_for = (file_path, rules)
+
+    def remember_paragraphs(self):
+        """Хэши абзацев текста виджета; текст читается блоками строк"""
+        self.paragraph_hashes = {
+            hash(paragraph.rstrip("\n")) for paragraph in iter_paragraphs(self.iter_lines())
+        }
+
+    def correct_all(self, rules, file_path):
+        """Потоковое исправление: исходный текст забирается из виджета
+        блоками строк, а результат вставляется перед ещё не прочитанным
+        остатком, так что целиком текст в виджете дважды не лежит.
+        Возвращает хэши абзацев результата"""
+        widget = self.text_frame
+        widget.mark_set(SOURCE_MARK, "1.0")
+        widget.mark_gravity(SOURCE_MARK, "right")
+        taken = False
+
+        def take_source():
+            nonlocal taken
+            while True:
+                line = int(widget.index(SOURCE_MARK).split(".")[0])
+                end = f"{line + WIDGET_BLOCK_LINES}.0"
+                if widget.compare(end, ">", "end-1c"):
+                    end = "end-1c"
+                text = widget.get(SOURCE_MARK, end)
+                if not text:
+                    return
+                widget.delete(SOURCE_MARK, end)
+                taken = True
+                yield text
+
+        pieces = self._pipeline(
+            group_pieces(iter_paragraphs(take_source()), STREAM_CHUNK_CHARS),
+            rules,
+            file_path,
+        )
+        hashes = set()
+        try:
+            batch = []
+            size = 0
+            for paragraph in iter_paragraphs(pieces):
+                hashes.add(hash(paragraph.rstrip("\n")))
+                batch.append(paragraph)
+                size += len(paragraph)
+                if size >= WIDGET_INSERT_CHARS:
+                    widget.insert(SOURCE_MARK, "".join(batch))
+                    batch = []
+                    size = 0
+            widget.insert(SOURCE_MARK, "".join(batch))
+        except BaseException:
+            # Исправление — один шаг отмены: откат возвращает исходный текст
+            if taken:
+                widget.edit_undo()
+            raise
+        finally:
+            widget.mark_unset(SOURCE_MARK)
+        return hashes
+
+    def correct_changed(self, rules, file_path):
+        """Исправляет только абзацы, чьих хэшей нет среди запомненных.
+
+        Текст читается блоками строк, в памяти остаются лишь такие абзацы.
+        Подряд идущие исправляются одним куском. В кусок входят и пустые
+        строки перед ним, чтобы правила вроде "\\n\\n%" видели начало
+        абзаца. Соседние абзацы не трогаются: правила не идемпотентны
+        (" ***" -> "***"), повторная правка их бы испортила.
+        Возвращает число изменённых кусков.
+        """
+        widget = self.text_frame
+        # [начало, конец, части текста]; абзацы начинаются с начала строки
+        blocks = []
+        block = None
+        line = 1
+        blank = 0
+        for paragraph in iter_paragraphs(self.iter_lines()):
+            body = paragraph.rstrip("\n")
+            if hash(body) in self.paragraph_hashes:
+                if block:
+                    block[1] = f"{line}.0"
+                    blocks.append(block)
+                    block = None
+            elif block:
+                block[2].append(paragraph)
+            else:
+                # Пустые строки перед абзацем — хвост предыдущего
+                start = f"{line - blank}.end" if blank else "1.0"
+                block = [start, None, ["\n" * blank, paragraph]]
+            line += paragraph.count("\n")
+            blank = len(paragraph) - len(body)
+        if block:
+            block[1] = "end-1c"
+            blocks.append(block)
+
+        changed = 0
+        # С конца, чтобы индексы ещё не обработанных кусков не сдвигались
+        for start, end, parts in reversed(blocks):
+            text = "".join(parts)
+            at_start = widget.compare(start, "==", "1.0")
+            pieces = self._pipeline([text], rules, file_path, at_start, end == "end-1c")
+            corrected = "".join(pieces)
+            if corrected != text:
+                widget.replace(start, end, corrected)
+                changed += 1
+        return changed
+
+    def strip_edges(self):
+        """Как strip() + "\\n" в конце полного исправления: пробелы и пустые
+        строки по краям текста убираются, в конце остаётся один перевод
+        строки. Читаются только крайние блоки строк"""
+        widget = self.text_frame
+        line = 1
+        while True:
+            text = widget.get(f"{line}.0", f"{line + WIDGET_BLOCK_LINES}.0")
+            stripped = text.lstrip()
+            if stripped:
+                break
+            if widget.compare(f"{line + WIDGET_BLOCK_LINES}.0", ">=", "end-1c"):
+                # Текст из одних пробелов
+                if widget.get("1.0", "end-1c") != "\n":
+                    widget.replace("1.0", "end-1c", "\n")
+                return
+            line += WIDGET_BLOCK_LINES
+        if len(stripped) < len(text):
+            widget.delete("1.0", f"{line}.0 +{len(text) - len(stripped)}c")
+
+        first = int(widget.index("end-1c").split(".")[0])
+        while True:
+            first = max(1, first - WIDGET_BLOCK_LINES)
+            text = widget.get(f"{first}.0", "end-1c")
+            stripped = text.rstrip()
+            if stripped or first == 1:
+                break
+        if text[len(stripped) :] != "\n":
+            widget.replace(f"end-{len(text) - len(stripped) + 1}c", "end-1c", "\n")
+
+    def iter_lines(self):
+        """Текст виджета блоками строк"""
+        last_line = int(self.text_frame.index("end-1c").split(".")[0])
+        for line in range(1, last_line + 1, WIDGET_BLOCK_LINES):
+            end = line + WIDGET_BLOCK_LINES
+            yield self.text_frame.get(
+                f"{line}.0", f"{end}.0" if end <= last_line else "end-1c"
+            )
+
+    def iter_corrected(self, pieces, file_path):
+        """Потоковый вариант normalize_text(text.strip(), file_path): куски
+        исходного текста -> куски исправленного. Текст режется на абзацы,
+        каждое правило переносит через границу кусков то, что может
+        совпасть с продолжением. RulesError бросается сразу"""
+        rules = load_rules(file_path)
+        pieces = group_pieces(iter_paragraphs(pieces), STREAM_CHUNK_CHARS)
+        return self._pipeline(pieces, rules, file_path)
+
+    def _pipeline(self, pieces, rules, file_path, at_start=True, at_end=True):
+        """Цепочка генераторов исправления. Заголовок и обрезка пробелов
+        делаются только на краях документа: at_start / at_end"""
+        if at_start:
+            pieces = lstrip_pieces(pieces)
+        if at_end:
+            pieces = rstrip_pieces(pieces)
+        if at_start:
+            pieces = self._with_header(pieces, file_path)
+        pieces = self._fixed_line_starts(rules.stream(pieces))
+        if at_start:
+            pieces = lstrip_pieces(pieces)
+        if at_end:
+            pieces = itertools.chain(rstrip_pieces(pieces), "\n")
+        return pieces
+
+    def _with_header(self, pieces, file_path):
+        head = ""
+        for piece in pieces:
+            head += piece
+            # Для проверки заголовка нужны два первых символа
+            if len(head) >= 2:
+                break
+        yield self.title_header(head, file_path) + head
+        yield from pieces
+
+    def _fixed_line_starts(self, pieces):
+        carry = ""
+        for piece in pieces:
+            newline = piece.rfind("\n")
+            if newline < 0:
+                carry += piece
+                continue
+            # Строки обрабатываются независимо: режем после последнего \n
+            chunk = carry + piece[: newline + 1]
+            carry = piece[newline + 1 :]
+            yield self.fix_line_start_spaces(chunk) + "\n"
+        yield self.fix_line_start_spaces(carry)
+
+    def title_header(self, content: str, file_path: str) -> str:
+        """Строки % с названием и автором, добавляемые в начало текста"""
         filename, _ = os.path.splitext(os.path.basename(file_path))
         base_name = re.sub(r" \[.*?\]", "", filename).strip().replace(".", "_")
         if content.startswith("#"):
@@ -70,23 +408,24 @@ class TextCorrector:
                 title = match.group(1).strip()
                 if match.group(2):
                     author = match.group(2).strip()
-            content = f"% {title}\n% Автор: {author}\n\n\n{content}"
+            return f"% {title}\n% Автор: {author}\n\n\n"
         elif content.startswith("\n%"):
-            content = f"% {base_name}{content}"
-
-        # Простые замены
-        for old, new in replacements["simple"].items():
-            content = content.replace(old, new)
+            return f"% {base_name}"
+        return ""
 
-        # Замены через регулярки
-        for pattern, repl in replacements["regex"].items():
-            content = re.sub(pattern, repl, content, flags=re.MULTILINE)
+    def normalize_text(self, content: str, file_path: str, profile=None) -> str:
+        """Исправленный текст. Если передан список profile, правила
+        выполняются с замером и в него добавляются их RuleStat"""
+        # Заголовок
+        content = self.title_header(content, file_path) + content
 
-        # Убираем пробелы перед \n
-        content = re.sub(r" \n", "\n", content)
-        content = re.sub(r"\n #", "\n#", content)
-        content = re.sub(r"\n %", "\n%", content)
-        content = re.sub(r"\n\n%", "\n%", content)
+        # Простые замены, регулярки и чистка — по порядку таблицы правил
+        rules = load_rules(file_path)
+        if profile is None:
+            content = rules.apply(content)
+        else:
+            content, stats = rules.profile(content)
+            profile.extend(stats)
 
         # Гарантируем ровно один пробел в начале строки
         content = self.fix_line_start_spaces(content)
@@ -94,6 +433,13 @@ class TextCorrector:
         return content.strip() + "\n"
 
     def fix_line_start_spaces(self, content: str) -> str:
+        if not any(char in content for char in LINE_BREAKS):
+            # splitlines + join теряют перевод строки в конце
+            if content.endswith("\n"):
+                content = content[:-1]
+            content = BLANK_LINE.sub("\n", "\n" + content)
+            return LINE_START.sub("\n ", content)[1:]
+
         new_lines = []
         for line in content.splitlines():
             stripped = line.lstrip()
@@ -108,3 +454,23 @@ class TextCorrector:
                     line = stripped
                 new_lines.append(line)
         return "\n".join(new_lines)
+
+
+def main(argv=None):
+    """Потоковое исправление файлов: python text_corrector.py <файл.md> ..."""
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        print("usage: python text_corrector.py <файл.md> ...", file=sys.stderr)
+        return 2
+    status = 0
+    for path in paths:
+        try:
+            correct_file(path)
+        except (OSError, UnicodeDecodeError, RulesError) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,32 @@
+import bisect
 import tkinter as tk
 
+from line_ranges import LineRangeSet
 from markdown_text import MarkdownText
 
+# Отступ названия в списке по уровню заголовка
+INDENTS = {1: "", 2: "  ", 3: "    ", 4: "      ", 5: "        "}
+
+
+def parse_heading(line):
+    """(уровень, название) для строки-заголовка или None"""
+    if line.startswith("# "):
+        return 1, line[2:]
+    for level in (5, 4, 3, 2):
+        if line.startswith("#" * level):
+            return level, line[level + 1 :]
+    return None
+
+
+def parse_outline(lines, first_line=1):
+    """Оглавление документа: список (номер строки, уровень, название)"""
+    outline = []
+    for i, line in enumerate(lines, first_line):
+        heading = parse_heading(line)
+        if heading:
+            outline.append((i, heading[0], heading[1]))
+    return outline
+
 
 class TOCList(tk.Listbox):
     def __init__(
@@ -14,13 +39,12 @@ class TOCList(tk.Listbox):
         self.bind("<ButtonRelease-1>", self.on_select)
         self.bind("<<ListboxSelect>>", self.on_select)
 
-        # Словарь для хранения соответствия "заголовок" -> "номер строки"
-        self.headers_data = {}
+        # Заголовки по порядку: отсортированные номера строк и параллельно
+        # (уровень, название); индекс совпадает с индексом строки Listbox
+        self.heading_lines = []
+        self.headings = []
         self._update_job = None
 
-    def check_contains_text(self, text):
-        return any(text in str(value) for value in self.headers_data.values())
-
     def set_text_widget(self, widget):
         self.text_widget = widget
 
@@ -30,6 +54,15 @@ class TOCList(tk.Listbox):
         self._update_job = self.after(300, self.update_toc)
 
     def update_toc(self):
+        if not self.text_widget:
+            self.set_outline([])
+            return
+
+        lines = self.text_widget.get("1.0", tk.END).split("\n")
+        self.set_outline(parse_outline(lines))
+
+    def set_outline(self, outline):
+        """Заполняет список готовым оглавлением (номер строки, уровень, название)"""
         # сохраняем индекс выделенного элемента
         selected_index = None
         selection = self.curselection()
@@ -39,40 +72,10 @@ class TOCList(tk.Listbox):
         scroll_pos = self.yview()[0]
 
         self.delete(0, tk.END)
-        self.headers_data.clear()
-
-        if not self.text_widget:
-            return
-
-        lines = self.text_widget.get("1.0", tk.END).split("\n")
-
-        # Заполняем список и карту номерами строк
-        for i, line in enumerate(lines, 1):
-            if line.startswith("# "):
-                title = line[2:]
-                self.insert(tk.END, f"{title}")
-                listbox_index = self.size() - 1
-                self.headers_data[listbox_index] = (i, title)
-            elif line.startswith("#####"):
-                title = line[6:]
-                self.insert(tk.END, f"        {title}")
-                listbox_index = self.size() - 1
-                self.headers_data[listbox_index] = (i, title)
-            elif line.startswith("####"):
-                title = line[5:]
-                self.insert(tk.END, f"      {title}")
-                listbox_index = self.size() - 1
-                self.headers_data[listbox_index] = (i, title)
-            elif line.startswith("###"):
-                title = line[4:]
-                self.insert(tk.END, f"    {title}")
-                listbox_index = self.size() - 1
-                self.headers_data[listbox_index] = (i, title)
-            elif line.startswith("##"):
-                title = line[3:]
-                self.insert(tk.END, f"  {title}")
-                listbox_index = self.size() - 1
-                self.headers_data[listbox_index] = (i, title)
+        self.heading_lines = [line for line, _, _ in outline]
+        self.headings = [(level, title) for _, level, title in outline]
+        if outline:
+            self.insert(tk.END, *(self._item_text(h) for h in self.headings))
 
         # восстанавливаем выделение по индексу
         if selected_index is not None and selected_index < self.size():
@@ -85,6 +88,76 @@ class TOCList(tk.Listbox):
         if selected_index is not None:
             self.see(selected_index)
 
+    @staticmethod
+    def _item_text(heading):
+        level, title = heading
+        return f"{INDENTS[level]}{title}"
+
+    def apply_edits(self, edits):
+        """Обновляет оглавление по правкам текста (first, new_last, delta).
+
+        Перечитываются только изменённые строки, заголовки после них лишь
+        сдвигаются, а в Listbox удаляются и вставляются только отличающиеся
+        элементы — выделение и прокрутка остаются на месте.
+        """
+        if not self.text_widget or not edits:
+            return
+
+        lines = self.heading_lines
+        old = self.headings
+        headings = list(old)
+        # Элементы до head и последние tail элементов правками не затронуты
+        head = tail = len(headings)
+        dirty = LineRangeSet()
+
+        for first, new_last, delta in edits:
+            old_last = max(first, new_last - delta)
+            lo = bisect.bisect_left(lines, first)
+            hi = bisect.bisect_right(lines, old_last)
+            head = min(head, lo)
+            tail = min(tail, len(lines) - hi)
+            if delta:
+                lines[lo:] = [line + delta for line in lines[hi:]]
+            else:
+                del lines[lo:hi]
+            del headings[lo:hi]
+            dirty.apply_edit(first, old_last, delta)
+            dirty.add(first, new_last)
+
+        for first, last in dirty:
+            text = self.text_widget.get(f"{first}.0", f"{last}.end")
+            found = parse_outline(text.split("\n"), first)
+            pos = bisect.bisect_left(lines, first)
+            lines[pos:pos] = [line for line, _, _ in found]
+            headings[pos:pos] = [(level, title) for _, level, title in found]
+            head = min(head, pos)
+            tail = min(tail, len(lines) - pos - len(found))
+
+        self.headings = headings
+
+        # Одинаковые по тексту элементы по краям изменённого участка не трогаем
+        old_items = [self._item_text(h) for h in old[head : max(head, len(old) - tail)]]
+        new_items = [
+            self._item_text(h)
+            for h in headings[head : max(head, len(headings) - tail)]
+        ]
+        while old_items and new_items and old_items[-1] == new_items[-1]:
+            old_items.pop()
+            new_items.pop()
+        start = 0
+        while (
+            start < len(old_items)
+            and start < len(new_items)
+            and old_items[start] == new_items[start]
+        ):
+            start += 1
+
+        index = head + start
+        if len(old_items) > start:
+            self.delete(index, index + len(old_items) - start - 1)
+        if len(new_items) > start:
+            self.insert(index, *new_items[start:])
+
     def on_select(self, *args):
         if not self.text_widget:
             return
@@ -95,32 +168,20 @@ class TOCList(tk.Listbox):
 
         # Получаем номер строки из сохранённой карты
         listbox_index = selection[0]
-        text_line_number, title = self.headers_data.get(listbox_index, (None, None))
-
-        if text_line_number is not None:
+        if listbox_index < len(self.heading_lines):
+            text_line_number = self.heading_lines[listbox_index]
             # Переходим к нужной строке
             self.text_widget.mark_set("insert", f"{text_line_number}.0")
             self.text_widget.see(f"{text_line_number}.0")
             self.text_widget.focus_set()
 
     def update_selection_by_text_line(self, line_num):
-        selected_index = None
-        indexes = sorted(self.headers_data.keys())
-        for index in indexes:
-            if line_num < self.headers_data[index][0] and index >= 1:
-                if index == 1:
-                    if line_num >= self.headers_data[0][0]:
-                        selected_index = index - 1
-                    else:
-                        selected_index = None
-                else:
-                    selected_index = index - 1
-                break
-            elif index == len(indexes) - 1 and line_num >= self.headers_data[index][0]:
-                selected_index = index
-                break
-        if selected_index is None:
-            self.selection_clear(0, tk.END)
-        else:
+        # Последний заголовок не ниже строки курсора
+        selected_index = bisect.bisect_right(self.heading_lines, line_num) - 1
+        selection = self.curselection()
+        if selected_index < 0:
+            if selection:
+                self.selection_clear(0, tk.END)
+        elif selection != (selected_index,):
             self.selection_clear(0, tk.END)
             self.selection_set(selected_index)